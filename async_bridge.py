@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class AsyncRunner(QObject):
+    # Runs an asyncio event loop on a background thread for database
+    # coroutines. Results come back to the Qt (UI) thread through a queued
+    # signal, so callbacks may touch widgets directly.
+    finished = pyqtSignal(object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asyncio-db", daemon=True)
+        self.thread.start()
+        self.finished.connect(self.deliver)
+
+    def submit(self, coro, on_done=None, on_error=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        # The done callback fires on the loop thread; the signal hops to the UI
+        future.add_done_callback(lambda f: self.finished.emit(f, on_done, on_error))
+        return future
+
+    def run(self, coro, timeout=None):
+        # Blocking wait, for shutdown paths that must finish before exiting
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def deliver(self, future, on_done, on_error):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"Background database task failed: {error}")
+        elif on_done is not None:
+            on_done(future.result())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import mysql.connector
+from PIL import Image
+
+import catalog
+import db_async
+import tiled
+from db_async import AsyncConnectionPool, EditLogWriter
+from db_pool import ConnectionPool
+from save_queue import write_image
+from transformations import TRANSFORMATIONS, apply_chain
+
+# Headless counterpart of main.py: applies a chain of its filters to every
+# image in a folder or glob on all cores, writes results to <folder>/edits/
+# like the GUI does, and logs the edits to the same catalog.
+#
+#   python batch.py ~/photos --filters "B/W,Contrast"
+#   python batch.py "~/photos/**/*.jpg" --filters Blur --no-db
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+EDITS_FOLDER = "edits"
+
+# Images handed to the pool ahead of the ones being worked on, per worker
+QUEUE_DEPTH = 4
+
+PROGRESS_EVERY = 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Apply main.py filters to many images at once")
+    parser.add_argument("sources", nargs="+", help="directories or glob patterns")
+    parser.add_argument("--filters", required=True,
+                        help=f"comma-separated chain, from: {', '.join(TRANSFORMATIONS)}")
+    parser.add_argument("--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-db", action="store_true", help="only write files, log nothing")
+    parser.add_argument("--log-batch-size", type=int, default=1000)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="mini@123")
+    parser.add_argument("--database", default="photo_editor")
+    args = parser.parse_args()
+
+    args.filters = [name.strip() for name in args.filters.split(",") if name.strip()]
+    unknown = [name for name in args.filters if name not in TRANSFORMATIONS]
+    if unknown or not args.filters:
+        parser.error(f"unknown filters: {', '.join(unknown) or '(none given)'}")
+    return args
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def find_images(sources, recursive):
+    found = []
+    for source in sources:
+        source = os.path.expanduser(source)
+        if os.path.isdir(source):
+            if recursive:
+                for dirpath, dirnames, filenames in os.walk(source):
+                    # Never feed earlier results back in
+                    dirnames[:] = [name for name in dirnames if name != EDITS_FOLDER]
+                    found.extend(os.path.join(dirpath, name) for name in filenames if is_image(name))
+            else:
+                found.extend(
+                    os.path.join(source, name) for name in os.listdir(source)
+                    if is_image(name) and os.path.isfile(os.path.join(source, name))
+                )
+        else:
+            found.extend(
+                path for path in glob.glob(source, recursive=recursive)
+                if is_image(path) and os.path.basename(os.path.dirname(path)) != EDITS_FOLDER
+            )
+    # Globs and folders may overlap
+    return sorted(set(os.path.abspath(path) for path in found))
+
+
+def output_path(source):
+    directory, filename = os.path.split(source)
+    return os.path.join(directory, EDITS_FOLDER, filename)
+
+
+def init_worker():
+    # The pool already has a process per core; strip threads would only
+    # compete with it
+    tiled.PARALLEL_WORKERS = 1
+
+
+def process_image(source, filters):
+    # Runs in a worker process
+    destination = output_path(source)
+    try:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with Image.open(source) as image:
+            write_image(apply_chain(image, filters), destination)
+    except Exception as err:
+        return source, destination, f"{type(err).__name__}: {err}"
+    return source, destination, None
+
+
+def create_catalog(config):
+    pool = ConnectionPool(config, pool_size=1)
+    try:
+        with pool.cursor() as cursor:
+            catalog.ensure_schema(cursor)
+    finally:
+        pool.close()
+
+
+async def register(pool, paths):
+    # One bulk upsert per folder; returns {path: images.id}
+    by_folder = defaultdict(list)
+    for path in paths:
+        directory, filename = os.path.split(path)
+        by_folder[directory].append(filename)
+    image_ids = {}
+    for directory, filenames in by_folder.items():
+        ids = await db_async.register_images(pool, directory, filenames)
+        image_ids.update((os.path.join(directory, filename), image_id) for filename, image_id in ids.items())
+    return image_ids
+
+
+async def run(args, paths):
+    pool = edit_log = None
+    image_ids = {}
+    if not args.no_db:
+        config = {
+            "host": args.host,
+            "user": args.user,
+            "password": args.password,
+            "database": args.database,
+        }
+        await asyncio.to_thread(create_catalog, config)
+        pool = AsyncConnectionPool(config)
+        edit_log = EditLogWriter(pool, batch_size=args.log_batch_size)
+        image_ids = await register(pool, paths)
+
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(args.workers * QUEUE_DEPTH)
+    failures = []
+    done = 0
+    start = time.perf_counter()
+
+    async def handle(executor, path):
+        nonlocal done
+        try:
+            source, destination, error = await loop.run_in_executor(executor, process_image, path, args.filters)
+        finally:
+            slots.release()
+        done += 1
+        if error is not None:
+            failures.append((source, error))
+        elif edit_log is not None:
+            for name in args.filters:
+                edit_log.add(image_ids[source], name, destination)
+        if done % PROGRESS_EVERY == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{done}/{len(paths)} images, {done / elapsed:.1f} images/s", flush=True)
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            tasks = []
+            for path in paths:
+                # Keeps only a bounded number of images queued in the pool
+                await slots.acquire()
+                tasks.append(asyncio.create_task(handle(executor, path)))
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    finally:
+        if edit_log is not None:
+            await edit_log.close()
+            await pool.close()
+
+    return elapsed, failures
+
+
+def main():
+    args = parse_args()
+    paths = find_images(args.sources, args.recursive)
+    if not paths:
+        print("No images found")
+        return
+
+    print(f"Processing {len(paths)} images with {args.workers} workers: {' -> '.join(args.filters)}")
+    try:
+        elapsed, failures = asyncio.run(run(args, paths))
+    except mysql.connector.Error as err:
+        print(f"Database error: {err} (use --no-db to skip logging)")
+        sys.exit(1)
+
+    processed = len(paths) - len(failures)
+    print(f"Processed {processed} images in {elapsed:.2f} s ({processed / elapsed:.1f} images/s)")
+    for source, error in failures[:20]:
+        print(f"  failed: {source}: {error}")
+    if failures:
+        print(f"{len(failures)} images failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
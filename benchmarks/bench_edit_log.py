@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_async
+from db_async import AsyncConnectionPool, EditLogWriter
+from standin_db import StandInAsyncPool
+
+# Edit-log throughput with one INSERT + commit per edit versus the batched
+# EditLogWriter. Uses a scratch database on a MySQL server, or with
+# --standin a durable SQLite file through standin_db.StandInAsyncPool; the
+# stand-in measures the client path and the per-commit fsync, not MySQL's
+# own statement and redo log costs, so compare ratios rather than rates.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark edits table logging")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="mini@123")
+    parser.add_argument("--database", default="photo_editor_bench")
+    parser.add_argument("--edits", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-delay", type=float, default=0.5)
+    parser.add_argument("--standin", metavar="PATH", help="SQLite file to use instead of MySQL")
+    parser.add_argument("--round-trip", type=float, default=0.0,
+                        help="milliseconds added per statement and commit on the stand-in")
+    return parser.parse_args()
+
+
+async def create_tables(pool):
+    await pool.execute("DROP TABLE IF EXISTS edits")
+    await pool.execute("DROP TABLE IF EXISTS images")
+    await pool.execute("""
+        CREATE TABLE images (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            filename VARCHAR(255) NOT NULL,
+            filepath VARCHAR(255) NOT NULL,
+            original_path VARCHAR(255) NOT NULL,
+            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            description TEXT
+        )
+    """)
+    await pool.execute("""
+        CREATE TABLE edits (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            image_id INT,
+            filter_name VARCHAR(50) NOT NULL,
+            edit_path VARCHAR(255) NOT NULL,
+            date_edited TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
+        )
+    """)
+    return await db_async.register_image(pool, "bench.jpg", "/tmp", "/tmp/bench.jpg")
+
+
+async def unbatched(pool, image_id, edits):
+    for i in range(edits):
+        await db_async.log_edit(pool, image_id, "Blur", f"/tmp/edits/{i}.jpg")
+
+
+async def batched(pool, image_id, edits, batch_size, max_delay):
+    writer = EditLogWriter(pool, batch_size, max_delay)
+    for i in range(edits):
+        writer.add(image_id, "Blur", f"/tmp/edits/{i}.jpg")
+        # Yield like the UI-driven callers do, so timed flushes can run
+        await asyncio.sleep(0)
+    await writer.close()
+
+
+async def run(args):
+    config = {
+        "host": args.host,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database,
+    }
+    if args.standin:
+        pool = StandInAsyncPool(args.standin, args.round_trip / 1000)
+    else:
+        pool = AsyncConnectionPool(config)
+    await pool.ensure_database()
+    image_id = await create_tables(pool)
+
+    results = []
+    for name, coro in (
+        ("one commit per edit", unbatched(pool, image_id, args.edits)),
+        (f"batched ({args.batch_size} rows)", batched(pool, image_id, args.edits, args.batch_size, args.max_delay)),
+    ):
+        await pool.execute("DELETE FROM edits")
+        start = time.perf_counter()
+        await coro
+        elapsed = time.perf_counter() - start
+        rows = (await pool.fetchone("SELECT COUNT(*) FROM edits"))[0]
+        results.append((name, elapsed, rows))
+
+    await pool.execute("DROP TABLE edits")
+    await pool.execute("DROP TABLE images")
+    await pool.close()
+
+    for name, elapsed, rows in results:
+        print(f"{name:>24}: {args.edits} edits in {elapsed:.2f} s "
+              f"({args.edits / elapsed:.0f} edits/s), {rows} rows written")
+    if any(rows != args.edits for _, _, rows in results):
+        print("FAILED: row count mismatch")
+        sys.exit(1)
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_sepia import make_image
+import edit_pipeline
+import tiled
+from transformations import TRANSFORMATIONS
+
+# Time of the heavy filters on tiled.py's strip thread pool with 1..N
+# threads. Speedup is relative to the plain single-threaded call.
+
+OPERATIONS = {
+    "Blur": TRANSFORMATIONS["Blur"],
+    "Sharpness": TRANSFORMATIONS["Sharpness"],
+    "Saturation": TRANSFORMATIONS["Saturation"],
+    "Contrast": TRANSFORMATIONS["Contrast"],
+    "sepia": lambda img: edit_pipeline.apply_filter(img, "sepia"),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure strip-parallel filter scaling")
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--max-threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def timed(func, image, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def thread_counts(max_threads):
+    counts = [1]
+    while counts[-1] * 2 < max_threads:
+        counts.append(counts[-1] * 2)
+    if max_threads > 1:
+        counts.append(max_threads)
+    return counts
+
+
+def main():
+    args = parse_args()
+    image = make_image(args.megapixels)
+    counts = thread_counts(args.max_threads)
+    print(f"{args.megapixels:g} MP RGB image, {os.cpu_count()} CPUs; best of {args.repeat}, seconds (speedup)")
+    print(f"{'operation':>12} {'serial':>8} " + " ".join(f"{f'{count} thr':>15}" for count in counts))
+    for name, func in OPERATIONS.items():
+        tiled.PARALLEL_THRESHOLD_PIXELS = float("inf")
+        serial = timed(func, image, args.repeat)
+        tiled.PARALLEL_THRESHOLD_PIXELS = 0
+        cells = []
+        for count in counts:
+            tiled.PARALLEL_WORKERS = count
+            elapsed = timed(func, image, args.repeat)
+            cells.append(f"{elapsed:7.3f} ({serial / elapsed:4.1f}x)")
+        print(f"{name:>12} {serial:8.3f} " + " ".join(f"{cell:>15}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import color_filters
+
+SIZES_MP = [1, 12, 48]
+
+
+def make_image(megapixels):
+    # 4:3 test image with a smooth gradient so every channel value is exercised
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(megapixels * 1_000_000 / width)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return Image.merge("RGB", (gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT),
+                               gradient.transpose(Image.FLIP_TOP_BOTTOM)))
+
+
+def legacy_sepia(image):
+    # The per-pixel loop ImageEditor.apply_filter("sepia") used before
+    width, height = image.size
+    pixels = image.load()
+    sepia_img = Image.new("RGB", (width, height))
+    sepia_pixels = sepia_img.load()
+    for i in range(width):
+        for j in range(height):
+            r, g, b = pixels[i, j]
+            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
+            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
+            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
+            sepia_pixels[i, j] = (min(255, tr), min(255, tg), min(255, tb))
+    return sepia_img
+
+
+def timed(func, image):
+    start = time.perf_counter()
+    func(image)
+    return time.perf_counter() - start
+
+
+def main():
+    skip_legacy = "--skip-legacy" in sys.argv
+    print(f"{'size':>6} {'legacy (s)':>12} {'matrix (s)':>12} {'speedup':>10}")
+    for megapixels in SIZES_MP:
+        image = make_image(megapixels)
+        fast = min(timed(color_filters.sepia, image) for _ in range(3))
+        if skip_legacy:
+            print(f"{megapixels:>4}MP {'-':>12} {fast:>12.3f} {'-':>10}")
+            continue
+        slow = timed(legacy_sepia, image)
+        print(f"{megapixels:>4}MP {slow:>12.3f} {fast:>12.3f} {slow / fast:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start of main.py and demo3.py: a fresh interpreter per run, timed
+# from spawning the process to the first paint of the app's main window.
+# The app runs unchanged under a probe that watches paint events; message
+# boxes shown before the window (e.g. a failed database connection) are
+# dismissed and reported, and the process is ended once the window has
+# painted. Runs offscreen, so no display is needed.
+
+PROBE = r"""
+import os
+import runpy
+import sys
+from PyQt5 import QtWidgets
+from PyQt5.QtCore import QEvent, QObject, QTimer
+
+
+class Probe(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj.isWidgetType() and obj.isWindow():
+            if isinstance(obj, QtWidgets.QDialog):
+                if not obj.property("probed"):
+                    obj.setProperty("probed", True)
+                    print("dialog", type(obj).__name__, obj.windowTitle(), flush=True)
+                    QTimer.singleShot(0, obj.reject)
+            else:
+                print("window", type(obj).__name__, flush=True)
+                os._exit(0)
+        return False
+
+
+class ProbedApplication(QtWidgets.QApplication):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.probe = Probe()
+        self.installEventFilter(self.probe)
+
+
+QtWidgets.QApplication = ProbedApplication
+script = sys.argv[1]
+sys.argv = [script]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name="__main__")
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure time from launch to the first painted window")
+    parser.add_argument("apps", nargs="*", default=["main.py", "demo3.py"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    return parser.parse_args()
+
+
+def launch(script, timeout):
+    # (seconds to the main window or None, [(seconds, dialog line)], exit code)
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", PROBE, os.path.join(ROOT, script)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    dialogs = []
+    window = None
+    try:
+        for line in process.stdout:
+            elapsed = time.perf_counter() - start
+            if line.startswith("dialog"):
+                dialogs.append((elapsed, line.split(" ", 2)[2].strip()))
+            elif line.startswith("window"):
+                window = elapsed
+                break
+            if elapsed > timeout:
+                break
+    finally:
+        process.kill()
+        code = process.wait()
+    return window, dialogs, code
+
+
+def main():
+    args = parse_args()
+    print(f"Time to first main window paint, {args.repeat} fresh processes each, milliseconds")
+    for script in args.apps:
+        times = []
+        notes = set()
+        for _ in range(args.repeat):
+            window, dialogs, code = launch(script, args.timeout)
+            for elapsed, title in dialogs:
+                notes.add(f"dialog '{title}' first")
+            if window is None:
+                notes.add(f"no window (exit code {code})")
+            else:
+                times.append(window)
+        if times:
+            result = f"best {min(times) * 1000:7.0f}  median {statistics.median(times) * 1000:7.0f}"
+        else:
+            result = f"{'-':>12}  {'':>14}"
+        print(f"{script:>10}  {result}  {'; '.join(sorted(notes))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Peak memory and time of the heavy filters on a large image, with and
+# without tiled.py's strip mode. Each measurement runs in a fresh process
+# so ru_maxrss only reflects that one operation.
+
+# "copy" allocates just the output image, as a reference
+OPERATIONS = ["copy", "Sharpness", "Saturation", "Contrast", "Blur", "sepia"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare tiled and untiled filter memory use")
+    parser.add_argument("--megapixels", type=float, default=100)
+    parser.add_argument("--child", nargs=2, metavar=("OPERATION", "MODE"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def child(operation, mode, megapixels):
+    from bench_sepia import make_image
+    import edit_pipeline
+    import tiled
+    from transformations import TRANSFORMATIONS
+
+    tiled.TILE_THRESHOLD_PIXELS = 0 if mode == "tiled" else float("inf")
+    image = make_image(megapixels)
+    baseline = peak_rss()
+    start = time.perf_counter()
+    if operation == "copy":
+        image.copy()
+    elif operation == "sepia":
+        edit_pipeline.apply_filter(image, "sepia")
+    else:
+        TRANSFORMATIONS[operation](image)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed} {peak_rss() - baseline}")
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        child(*args.child, args.megapixels)
+        return
+
+    image_mb = args.megapixels * 3
+    print(f"{args.megapixels:g} MP RGB image ({image_mb:.0f} MB of pixels); peak RSS growth per operation")
+    print(f"{'operation':>12} {'untiled':>18} {'tiled':>18}")
+    for operation in OPERATIONS:
+        cells = []
+        for mode in ("untiled", "tiled"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--megapixels", str(args.megapixels), "--child", operation, mode],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            elapsed, extra = float(output[0]), int(output[1])
+            cells.append(f"{extra / 2**20:6.0f} MB {elapsed:6.2f} s")
+        print(f"{operation:>12} {cells[0]:>18} {cells[1]:>18}")
+
+
+if __name__ == "__main__":
+    main()
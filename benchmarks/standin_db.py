@@ -0,0 +1,287 @@
+import asyncio
+import bisect
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# In-process stand-in for db_pool.ConnectionPool, used by suite.py when no
+# MySQL server is available. It answers exactly the statements that
+# demo3.DatabaseHandler and blob_chunks issue on the benchmarked paths,
+# from dicts, so timings cover the client side (paging, chunking, thumbnail
+# handling) without the server or network. Anything else raises, so a new
+# query on those paths shows up instead of being silently skipped.
+
+
+def normalize(query):
+    return " ".join(query.split())
+
+
+class StandInCursor:
+    def __init__(self, pool):
+        self.pool = pool
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        query = normalize(query)
+        for prefix, handler in self.pool.handlers:
+            if query.startswith(prefix):
+                self.rows = handler(*params) or []
+                self.lastrowid = self.pool.lastrowid
+                return
+        raise NotImplementedError(f"Stand-in database cannot run: {query}")
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class StandInPool:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.images = {}
+        self.image_ids = []
+        self.thumbnails = {}
+        self.uploads = {}
+        self.chunks = {}
+        self.lastrowid = None
+        self.handlers = [
+            ("INSERT INTO uploads", self.insert_upload),
+            ("SELECT u.chunk_size, COUNT(c.seq)", self.upload_progress),
+            ("INSERT INTO image_chunks", self.insert_chunk),
+            ("SELECT size FROM uploads", self.upload_size),
+            ("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM image_chunks", self.upload_bytes),
+            ("UPDATE uploads SET file_key = NULL", self.finish_upload),
+            ("SELECT data FROM image_chunks", self.chunk),
+            ("DELETE FROM uploads WHERE id", self.delete_upload),
+            ("INSERT INTO images (name, image_type, upload_id)", self.insert_image),
+            ("INSERT INTO image_thumbnails", self.insert_thumbnail),
+            ("SELECT name, image_type, blob_hash, upload_id FROM images WHERE id", self.image),
+            ("SELECT blob_hash, upload_id FROM images WHERE id", self.image_storage),
+            ("DELETE FROM images WHERE id", self.delete_image),
+            ("SELECT id, name, image_type FROM images WHERE id >", self.image_page),
+            ("SELECT image_id, thumbnail FROM image_thumbnails WHERE image_id IN", self.thumbnail_rows),
+        ]
+
+    # ConnectionPool interface
+
+    @contextmanager
+    def cursor(self, buffered=True):
+        with self.lock:
+            yield StandInCursor(self)
+
+    def run(self, func, retries=1):
+        with self.cursor() as cursor:
+            return func(cursor)
+
+    def execute(self, query, params=()):
+        with self.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.lastrowid
+
+    def fetchone(self, query, params=()):
+        with self.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone()
+
+    def fetchall(self, query, params=()):
+        with self.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def close(self):
+        pass
+
+    def seed_images(self, count, thumbnail):
+        # count metadata rows sharing one thumbnail, replacing any rows
+        with self.lock:
+            self.images.clear()
+            self.image_ids.clear()
+            self.thumbnails.clear()
+            for image_id in range(1, count + 1):
+                self.images[image_id] = (f"image_{image_id:06d}.jpg", "jpg", None, None)
+                self.image_ids.append(image_id)
+                self.thumbnails[image_id] = thumbnail
+
+    # Statements
+
+    def insert_upload(self, file_key, size, chunk_size):
+        for upload_id, upload in self.uploads.items():
+            if upload["file_key"] == file_key:
+                self.lastrowid = upload_id
+                return
+        self.lastrowid = len(self.uploads) + 1
+        while self.lastrowid in self.uploads:
+            self.lastrowid += 1
+        self.uploads[self.lastrowid] = {"file_key": file_key, "size": size, "chunk_size": chunk_size}
+        self.chunks[self.lastrowid] = []
+
+    def upload_progress(self, upload_id):
+        return [(self.uploads[upload_id]["chunk_size"], len(self.chunks[upload_id]))]
+
+    def insert_chunk(self, upload_id, seq, data):
+        chunks = self.chunks[upload_id]
+        if seq < len(chunks):
+            chunks[seq] = data
+        else:
+            chunks.append(data)
+
+    def upload_size(self, upload_id):
+        upload = self.uploads.get(upload_id)
+        return [(upload["size"],)] if upload else []
+
+    def upload_bytes(self, upload_id):
+        return [(sum(len(data) for data in self.chunks.get(upload_id, [])),)]
+
+    def finish_upload(self, upload_id):
+        self.uploads[upload_id]["file_key"] = None
+
+    def chunk(self, upload_id, seq):
+        chunks = self.chunks.get(upload_id, [])
+        return [(chunks[seq],)] if seq < len(chunks) else []
+
+    def delete_upload(self, upload_id):
+        self.uploads.pop(upload_id, None)
+        self.chunks.pop(upload_id, None)
+
+    def insert_image(self, name, image_type, upload_id):
+        self.lastrowid = (self.image_ids[-1] if self.image_ids else 0) + 1
+        self.images[self.lastrowid] = (name, image_type, None, upload_id)
+        self.image_ids.append(self.lastrowid)
+
+    def insert_thumbnail(self, image_id, thumbnail):
+        self.thumbnails[image_id] = thumbnail
+
+    def image(self, image_id):
+        row = self.images.get(image_id)
+        return [row] if row else []
+
+    def image_storage(self, image_id):
+        row = self.images.get(image_id)
+        return [row[2:]] if row else []
+
+    def delete_image(self, image_id):
+        if self.images.pop(image_id, None) is not None:
+            self.image_ids.remove(image_id)
+            self.thumbnails.pop(image_id, None)
+
+    def image_page(self, after_id, limit):
+        start = bisect.bisect_right(self.image_ids, after_id)
+        return [
+            (image_id, self.images[image_id][0], self.images[image_id][1])
+            for image_id in self.image_ids[start:start + limit]
+        ]
+
+    def thumbnail_rows(self, *image_ids):
+        return [(image_id, self.thumbnails[image_id]) for image_id in image_ids if image_id in self.thumbnails]
+
+
+# Async stand-in for db_async.AsyncConnectionPool, used by bench_edit_log.py
+# when no MySQL server is available. Statements run on an SQLite file with
+# synchronous=FULL, so every commit waits for an fsync the way InnoDB does
+# with its default innodb_flush_log_at_trx_commit=1. round_trip seconds are
+# added per statement and per commit to stand for the network hop to the
+# server. MySQL-only syntax the benchmark uses is rewritten on the way.
+
+SQLITE_REWRITES = [
+    ("INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY"),
+    (" ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)", ""),
+    ("%s", "?"),
+]
+
+
+def sqlite_query(query):
+    for mysql_text, sqlite_text in SQLITE_REWRITES:
+        query = query.replace(mysql_text, sqlite_text)
+    return query
+
+
+class StandInAsyncCursor:
+    def __init__(self, pool):
+        self.pool = pool
+        self.rows = []
+        self.lastrowid = None
+
+    async def execute(self, query, params=()):
+        cursor = await self.pool.call(self.pool.conn.execute, sqlite_query(query), tuple(params))
+        self.rows = cursor.fetchall()
+        self.lastrowid = cursor.lastrowid
+
+    async def executemany(self, query, seq_params):
+        # One multi-row INSERT on the wire, as mysql.connector sends it
+        await self.pool.call(self.pool.conn.executemany, sqlite_query(query), list(seq_params))
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def fetchall(self):
+        return list(self.rows)
+
+
+class StandInAsyncPool:
+    def __init__(self, path, round_trip=0.0):
+        self.round_trip = round_trip
+        self.conn = sqlite3.connect(path, isolation_level="DEFERRED", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.lock = None
+
+    async def call(self, func, *args):
+        return await asyncio.to_thread(self.on_server, func, *args)
+
+    def on_server(self, func, *args):
+        # Slept on the worker thread: the event loop's timers are too coarse
+        # for sub-millisecond delays
+        if self.round_trip:
+            time.sleep(self.round_trip)
+        return func(*args)
+
+    # AsyncConnectionPool interface
+
+    async def ensure_database(self):
+        pass
+
+    @asynccontextmanager
+    async def cursor(self, buffered=True):
+        # One connection, so transactions take turns like a pool of size 1
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            try:
+                yield StandInAsyncCursor(self)
+            except BaseException:
+                await self.call(self.conn.rollback)
+                raise
+            await self.call(self.conn.commit)
+
+    async def run(self, func, retries=1):
+        async with self.cursor() as cursor:
+            return await func(cursor)
+
+    async def execute(self, query, params=()):
+        async def execute_query(cursor):
+            await cursor.execute(query, params)
+            return cursor.lastrowid
+        return await self.run(execute_query)
+
+    async def fetchone(self, query, params=()):
+        async def fetch(cursor):
+            await cursor.execute(query, params)
+            return await cursor.fetchone()
+        return await self.run(fetch)
+
+    async def fetchall(self, query, params=()):
+        async def fetch(cursor):
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+        return await self.run(fetch)
+
+    async def close(self):
+        self.conn.close()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_pool import ConnectionPool
+
+# Concurrent reads and writes through one shared ConnectionPool against a
+# scratch table. Needs a reachable MySQL server; the table is dropped after.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stress test db_pool.ConnectionPool")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="mini@123")
+    parser.add_argument("--database", default="photo_editor_stress")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--operations", type=int, default=500, help="operations per thread")
+    parser.add_argument("--pool-size", type=int, default=5)
+    return parser.parse_args()
+
+
+def worker(pool, thread_id, operations, errors):
+    for i in range(operations):
+        try:
+            if i % 2 == 0:
+                pool.execute(
+                    "INSERT INTO pool_stress (thread_id, seq) VALUES (%s, %s)",
+                    (thread_id, i)
+                )
+            else:
+                count = pool.fetchone(
+                    "SELECT COUNT(*) FROM pool_stress WHERE thread_id = %s", (thread_id,)
+                )[0]
+                # Each thread's own writes are committed before it reads
+                if count != i // 2 + 1:
+                    errors.append(f"thread {thread_id}: expected {i // 2 + 1} rows, saw {count}")
+        except Exception as err:
+            errors.append(f"thread {thread_id}: {err!r}")
+
+
+def main():
+    args = parse_args()
+    config = {
+        "host": args.host,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database,
+    }
+    pool = ConnectionPool(config, pool_size=args.pool_size)
+    pool.execute("DROP TABLE IF EXISTS pool_stress")
+    pool.execute("""
+        CREATE TABLE pool_stress (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            thread_id INT NOT NULL,
+            seq INT NOT NULL,
+            INDEX (thread_id)
+        )
+    """)
+
+    errors = []
+    threads = [
+        threading.Thread(target=worker, args=(pool, t, args.operations, errors))
+        for t in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    expected_rows = args.threads * ((args.operations + 1) // 2)
+    total_rows = pool.fetchone("SELECT COUNT(*) FROM pool_stress")[0]
+    pool.execute("DROP TABLE pool_stress")
+    pool.close()
+
+    total_ops = args.threads * args.operations
+    print(f"{total_ops} operations on {args.threads} threads, pool size {args.pool_size}: "
+          f"{elapsed:.2f} s ({total_ops / elapsed:.0f} ops/s)")
+    print(f"rows written: {total_rows} (expected {expected_rows})")
+    for error in errors[:20]:
+        print(error)
+    if errors or total_rows != expected_rows:
+        print(f"FAILED with {len(errors)} errors")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import edit_pipeline
+from bench_sepia import make_image
+from history import EditHistory
+
+# Records 100 edits of a large image in an EditHistory and checks that peak
+# RSS grows by no more than the memory budget plus the working images the
+# edits themselves need. Then undoes every step and checks each restored
+# state against a fresh replay, and that an empty history restores to the
+# base image rather than to nothing.
+
+EDITS = [
+    ("brightness", (1.2,)),
+    ("contrast", (1.2,)),
+    ("rotate", (90,)),
+    ("filter", ("sepia",)),
+    ("brightness", (0.8,)),
+    ("flip", ("horizontal",)),
+    ("filter", ("blur",)),
+    ("contrast", (0.8,)),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check EditHistory memory use")
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--edits", type=int, default=100)
+    parser.add_argument("--budget-mb", type=int, default=256)
+    parser.add_argument("--no-spill", action="store_true", help="drop old states instead of spilling")
+    parser.add_argument("--verify-every", type=int, default=25, help="check every Nth undo step")
+    return parser.parse_args()
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def apply_all(image, operations):
+    # One operation at a time, the way the states were recorded
+    for operation in operations:
+        image = edit_pipeline.apply_operation(image, operation)
+    return image
+
+
+def main():
+    args = parse_args()
+    budget = args.budget_mb * 1024 * 1024
+    base = make_image(args.megapixels)
+    image_bytes = len(base.tobytes())
+    history = EditHistory(budget, spill=not args.no_spill)
+    history.reset(base)
+
+    # One warm-up edit so allocator growth from the first filter is not
+    # counted against the history
+    edit_pipeline.replay(base, EDITS)
+    baseline = peak_rss()
+
+    operations = []
+    image = base
+    start = time.perf_counter()
+    for i in range(args.edits):
+        operation = EDITS[i % len(EDITS)]
+        operations.append(operation)
+        image = edit_pipeline.apply_operation(image, operation)
+        history.record(operations, image)
+    elapsed = time.perf_counter() - start
+
+    # Source, current and next image, plus the tiles of the snapshot being cut
+    allowance = budget + 4 * image_bytes
+    growth = peak_rss() - baseline
+    print(f"{args.edits} edits of a {args.megapixels:g} MP image in {elapsed:.2f} s")
+    print(f"history: {len(history.snapshots)} states, "
+          f"{history.memory_used / 2**20:.0f} MiB in memory (budget {args.budget_mb} MiB)")
+    print(f"peak RSS growth: {growth / 2**20:.0f} MiB (allowed {allowance / 2**20:.0f} MiB)")
+
+    mismatches = 0
+    start = time.perf_counter()
+    current, current_operations = image, list(operations)
+    for count in range(len(operations) - 1, -1, -1):
+        target = operations[:count]
+        restored, done = history.restore(target, current, current_operations)
+        restored = apply_all(restored, target[done:])
+        if count % args.verify_every == 0:
+            expected = apply_all(base, target)
+            if restored.size != expected.size or restored.tobytes() != expected.tobytes():
+                print(f"undo to step {count}: restored image differs from replay")
+                mismatches += 1
+        current, current_operations = restored, target
+    print(f"undid {len(operations)} steps in {time.perf_counter() - start:.2f} s")
+    history.close()
+
+    # Closed: nothing stored, so the whole list replays from the base
+    restored, done = history.restore(operations[:3], base=base)
+    if restored is not base or done != 0:
+        print("empty history did not fall back to the base image")
+        mismatches += 1
+
+    if growth > allowance or mismatches:
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
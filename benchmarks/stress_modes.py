@@ -0,0 +1,116 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageChops, ImageStat
+
+import edit_pipeline
+from qt_image import pil_to_qimage
+
+# Regression check for the preview paths on every PNG image mode: files are
+# decoded at preview size, thumbnailed and converted for Qt the way the
+# upload, browser and editor paths do it. Palette, bilevel and 16-bit files
+# used to fail in reduce() with "image has wrong mode". 16-bit previews are
+# also checked for keeping their tones instead of clipping to white.
+# Every file is then edited and saved at full resolution the way the
+# editor's Save does it, and the result has to look like the edited preview.
+
+PREVIEW_SIZE = (700, 500)
+
+# Edits that look the same at any resolution. None of them clips, since
+# clipping the pure black and white of a bilevel image and then averaging
+# differs from clipping the grays of its downscaled preview.
+EDITS = [
+    ("brightness", (0.8,)),
+    ("contrast", (0.9,)),
+    ("grayscale", ()),
+    ("rotate", (90,)),
+    ("flip", ("horizontal",)),
+]
+
+# Mean difference per channel, out of 255, allowed between the downscaled
+# save and the edited preview
+MAX_PREVIEW_DIFFERENCE = 4
+
+
+def make_files(size):
+    # {label: PNG bytes}
+    base = Image.linear_gradient("L").resize(size)
+    rgb = Image.merge("RGB", (base, base.transpose(Image.FLIP_LEFT_RIGHT), base.transpose(Image.FLIP_TOP_BOTTOM)))
+    sixteen = base.convert("I").point(lambda value: value * 256)
+    images = {
+        "1": base.convert("1"),
+        "L": base,
+        "LA": Image.merge("LA", (base, base)),
+        "P": rgb.quantize(64),
+        "P+transparency": rgb.quantize(64),
+        "RGB": rgb,
+        "RGBA": Image.merge("RGBA", rgb.split() + (base,)),
+        "I": sixteen,
+        "I;16": sixteen.convert("I;16"),
+    }
+    files = {}
+    for label, image in images.items():
+        buffer = io.BytesIO()
+        if label == "P+transparency":
+            image.save(buffer, format="PNG", transparency=0)
+        else:
+            image.save(buffer, format="PNG")
+        files[label] = buffer.getvalue()
+    return files
+
+
+def check(data):
+    # Returns a problem description, or None
+    with Image.open(io.BytesIO(data)) as image:
+        mode = image.mode
+    preview = edit_pipeline.load_preview(io.BytesIO(data), PREVIEW_SIZE)
+    edit_pipeline.make_thumbnail_from_data(data, edit_pipeline.THUMBNAIL_SIZE)
+    qimage = pil_to_qimage(edit_pipeline.make_proxy(preview, (200, 150)))
+    if qimage.isNull():
+        return f"{mode}: null QImage"
+    if mode.startswith("I") and preview.convert("L").getextrema()[0] == 255:
+        return f"{mode}: preview clipped to white"
+
+    with Image.open(io.BytesIO(data)) as original:
+        saved = edit_pipeline.render_full_resolution(original, EDITS)
+        saved.save(io.BytesIO(), format="PNG")
+    edited_preview = edit_pipeline.replay(preview, EDITS).convert("RGB")
+    downscaled = edit_pipeline.make_proxy(saved, edited_preview.size).convert("RGB")
+    if downscaled.size != edited_preview.size:
+        return f"{mode}: saved image is {saved.size}, preview {edited_preview.size}"
+    difference = max(ImageStat.Stat(ImageChops.difference(downscaled, edited_preview)).mean)
+    if difference > MAX_PREVIEW_DIFFERENCE:
+        return f"{mode}: saved image differs from the preview by {difference:.1f}"
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check previews and thumbnails for every PNG image mode")
+    parser.add_argument("--width", type=int, default=1200)
+    parser.add_argument("--height", type=int, default=900)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    failures = 0
+    for label, data in make_files((args.width, args.height)).items():
+        start = time.perf_counter()
+        try:
+            problem = check(data)
+        except Exception as err:
+            problem = f"{type(err).__name__}: {err}"
+        elapsed = time.perf_counter() - start
+        status = "ok" if problem is None else f"FAILED {problem}"
+        print(f"{label:>15}  {elapsed * 1000:7.1f} ms  {status}")
+        failures += problem is not None
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PIL
+from PIL import Image
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from bench_sepia import make_image
+from standin_db import StandInPool
+
+# Headless benchmark suite. Times main.py's filters, the demo3 editor's
+# operations and preview, the image browser's paging and the chunked blob
+# save/fetch on generated images, and writes the results as JSON:
+#
+#   python benchmarks/suite.py --output before.json
+#   python benchmarks/suite.py --output after.json --baseline before.json
+#   python benchmarks/suite.py --compare before.json after.json
+#
+# Database paths run against an in-process stand-in unless --mysql is given,
+# in which case they use a separate <database>_bench schema.
+
+SIZES_MP = [1, 12, 48, 100]
+ROW_COUNTS = [100, 1000, 10000]
+GROUPS = ["transforms", "operations", "preview", "browser", "blobs"]
+
+# The ImageEditor buttons and sliders, as (name, args) operations
+EDITOR_OPERATIONS = [
+    ("rotate", (-90,)),
+    ("rotate", (90,)),
+    ("flip", ("horizontal",)),
+    ("flip", ("vertical",)),
+    ("brightness", (1.2,)),
+    ("brightness", (0.8,)),
+    ("contrast", (1.2,)),
+    ("contrast", (0.8,)),
+    ("saturation", (1.5,)),
+    ("blur", (0.01,)),
+    ("grayscale", ()),
+    ("filter", ("sepia",)),
+    ("filter", ("blur",)),
+    ("filter", ("sharpen",)),
+]
+
+# Slower than the baseline by more than this fraction counts as a regression;
+# measurements under MIN_COMPARED_SECONDS are too noisy to flag
+DEFAULT_THRESHOLD = 0.10
+MIN_COMPARED_SECONDS = 0.001
+
+# Seconds to wait for a preview render before giving up
+RENDER_TIMEOUT = 120
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the performance benchmark suite")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES_MP)), help="image sizes in megapixels")
+    parser.add_argument("--rows", default=",".join(map(str, ROW_COUNTS)), help="row counts for the image browser")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"subset of: {', '.join(GROUPS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is kept")
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL server from demo3.DB_CONFIG")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare this run with an earlier JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="only compare two JSON files")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    args.sizes = [float(size) for size in args.sizes.split(",") if size]
+    args.rows = [int(rows) for rows in args.rows.split(",") if rows]
+    args.groups = [group for group in args.groups.split(",") if group]
+    unknown = set(args.groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    return args
+
+
+def size_label(megapixels):
+    return f"{megapixels:g}MP"
+
+
+def make_photo(megapixels, seed=0):
+    # make_image's gradient plus seeded noise, so encoders and filters see
+    # photo-like detail and every run gets the same pixels
+    image = make_image(megapixels)
+    rng = random.Random(seed)
+    tile = Image.frombytes("RGB", (256, 256), rng.randbytes(256 * 256 * 3))
+    noise = Image.new("RGB", image.size)
+    for top in range(0, image.size[1], 256):
+        for left in range(0, image.size[0], 256):
+            noise.paste(tile, (left, top))
+    return Image.blend(image, noise, 0.25)
+
+
+def best_time(func, repeat, setup=None, teardown=None):
+    # One untimed warm-up run, then the fastest of repeat runs
+    best = None
+    for run in range(repeat + 1):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        result = func(state) if setup else func()
+        elapsed = time.perf_counter() - start
+        if teardown:
+            teardown(state, result)
+        if run:
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.results = {}
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        self.workdir = tempfile.mkdtemp(prefix="photo-bench-")
+        self.images = {}
+
+    def record(self, name, seconds):
+        self.results[name] = seconds
+        print(f"{name:<48} {seconds * 1000:12.1f} ms", flush=True)
+
+    def image(self, megapixels):
+        if megapixels not in self.images:
+            self.images = {megapixels: make_photo(megapixels)}
+        return self.images[megapixels]
+
+    def image_file(self, megapixels):
+        path = os.path.join(self.workdir, f"{size_label(megapixels)}.jpg")
+        if not os.path.exists(path):
+            self.image(megapixels).save(path, quality=90)
+        return path
+
+    def process_events_until(self, done, timeout):
+        deadline = time.perf_counter() + timeout
+        while not done():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Timed out waiting for the UI")
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def run(self):
+        import demo3
+        self.demo3 = demo3
+        self.handler = self.make_handler() if {"browser", "blobs"} & set(self.args.groups) else None
+        try:
+            for megapixels in self.args.sizes:
+                if "transforms" in self.args.groups:
+                    self.bench_transforms(megapixels)
+                if "operations" in self.args.groups:
+                    self.bench_operations(megapixels)
+                if "preview" in self.args.groups:
+                    self.bench_preview(megapixels)
+                if "blobs" in self.args.groups:
+                    self.bench_blobs(megapixels)
+            if "browser" in self.args.groups:
+                for rows in self.args.rows:
+                    self.bench_browser(rows)
+        finally:
+            if self.handler is not None:
+                self.handler.close()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        return self.results
+
+    def make_handler(self):
+        demo3 = self.demo3
+        if self.args.mysql:
+            demo3.DB_CONFIG = dict(demo3.DB_CONFIG, database=demo3.DB_CONFIG["database"] + "_bench")
+            handler = demo3.DatabaseHandler()
+            handler.start(handler.connect_to_database())
+            return handler
+        # Only the pool is replaced; every DatabaseHandler method is the real one
+        from async_bridge import AsyncRunner
+        handler = demo3.DatabaseHandler.__new__(demo3.DatabaseHandler)
+        handler.pool = StandInPool()
+        handler.blob_store = None
+        handler.runner = AsyncRunner()
+        return handler
+
+    def bench_transforms(self, megapixels):
+        from transformations import TRANSFORMATIONS
+        image = self.image(megapixels)
+        for name, transform in TRANSFORMATIONS.items():
+            seconds = best_time(lambda: transform(image), self.args.repeat)
+            self.record(f"transform/{name}/{size_label(megapixels)}", seconds)
+
+    def bench_operations(self, megapixels):
+        import edit_pipeline
+        image = self.image(megapixels)
+        for operation in EDITOR_OPERATIONS:
+            name, args = operation
+            label = f"{name}({', '.join(map(str, args))})"
+            seconds = best_time(lambda: edit_pipeline.apply_operation(image, operation), self.args.repeat)
+            self.record(f"operation/{label}/{size_label(megapixels)}", seconds)
+
+    def bench_preview(self, megapixels):
+        # ImageEditor.update_preview, from the request to the rendered pixmap
+        source = self.image_file(megapixels)
+
+        def open_editor():
+            # The editor deletes its file on close, so it gets a copy
+            path = os.path.join(self.workdir, "editing.jpg")
+            shutil.copyfile(source, path)
+            return (1, "bench.jpg", path, "jpg")
+
+        def wait_for_render(editor, action):
+            rendered = []
+            editor.render_scheduler.finished.connect(rendered.append)
+            start = time.perf_counter()
+            action()
+            self.process_events_until(lambda: rendered, RENDER_TIMEOUT)
+            elapsed = time.perf_counter() - start
+            editor.render_scheduler.finished.disconnect(rendered.append)
+            return elapsed
+
+        editor_sliders = [name for name, *_ in self.demo3.SLIDERS]
+        timings = {"open": [], "edit": [], "undo": []}
+        timings.update((f"slider_{name}", []) for name in editor_sliders)
+        for _ in range(self.args.repeat):
+            image = open_editor()
+            # The constructor requests the first render itself
+            start = time.perf_counter()
+            editor = self.demo3.ImageEditor(self.handler, image)
+            editor.show()
+            self.process_events_until(lambda: editor.current_pil_image is not None, RENDER_TIMEOUT)
+            timings["open"].append(time.perf_counter() - start)
+            timings["edit"].append(wait_for_render(editor, lambda: editor.apply_operation("brightness", 1.2)))
+            timings["undo"].append(wait_for_render(editor, editor.undo))
+            # One live frame while a slider is dragged: should stay well
+            # under 33 ms for 30 fps
+            for name in editor_sliders:
+                slider = editor.sliders[name]
+                editor.start_live(name)
+                slider.blockSignals(True)
+                slider.setValue(slider.maximum() // 2)
+                slider.blockSignals(False)
+                start = time.perf_counter()
+                editor.show_live_frame()
+                timings[f"slider_{name}"].append(time.perf_counter() - start)
+                editor.commit_slider(name)
+            editor.close()
+            self.app.processEvents()
+        for step, values in timings.items():
+            self.record(f"preview/{step}/{size_label(megapixels)}", min(values))
+
+    def bench_browser(self, rows):
+        import edit_pipeline
+        thumbnail = edit_pipeline.make_thumbnail(make_photo(0.3), edit_pipeline.THUMBNAIL_SIZE)
+        self.seed_rows(rows, thumbnail)
+
+        view = self.demo3.DatabaseView(self.handler)
+        view.show()
+        model = view.model
+
+        def thumbnails_loaded():
+            return (not model.fetching and not model.pending_thumbnails
+                    and not model.loading_thumbnails and not model.thumbnail_timer.isActive())
+
+        def load():
+            # First page plus the thumbnails of the visible items
+            view.load_images()
+            self.app.processEvents()
+            self.process_events_until(thumbnails_loaded, 30)
+
+        def scroll_all(_):
+            # Pages in every row, as scrolling to the end does
+            while not model.exhausted:
+                model.fetchMore()
+                self.process_events_until(lambda: not model.fetching, 30)
+
+        self.record(f"browser/load_images/{rows}", best_time(load, self.args.repeat))
+        self.record(f"browser/scroll_all/{rows}", best_time(scroll_all, self.args.repeat, setup=view.load_images))
+        view.close()
+
+    def seed_rows(self, rows, thumbnail):
+        if not self.args.mysql:
+            self.handler.pool.seed_images(rows, thumbnail)
+            return
+        with self.handler.pool.cursor() as cursor:
+            cursor.execute("DELETE FROM images")
+            cursor.executemany(
+                "INSERT INTO images (name, image_type) VALUES (%s, %s)",
+                [(f"image_{i:06d}.jpg", "jpg") for i in range(1, rows + 1)]
+            )
+            cursor.execute(
+                "INSERT INTO image_thumbnails (image_id, thumbnail) SELECT id, %s FROM images",
+                (thumbnail,)
+            )
+
+    def bench_blobs(self, megapixels):
+        # DatabaseHandler.save_image / download_image with a real JPEG file
+        source = self.image_file(megapixels)
+        label = size_label(megapixels)
+        saved = []
+
+        def save(path):
+            saved.append(self.handler.save_image(os.path.basename(path), path, "jpg"))
+
+        def fresh_copy():
+            # A new file each time, so the upload is not resumed from the last run
+            path = os.path.join(self.workdir, f"upload-{len(saved)}.jpg")
+            shutil.copyfile(source, path)
+            return path
+
+        self.record(f"blob/save/{label}", best_time(save, self.args.repeat, setup=fresh_copy))
+
+        def fetch():
+            return self.handler.download_image(saved[-1])
+
+        def remove(_, image):
+            os.remove(image[2])
+
+        self.record(f"blob/fetch/{label}", best_time(fetch, self.args.repeat, teardown=remove))
+        for image_id in saved:
+            self.handler.delete_image(image_id)
+
+
+def metadata(args):
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": "mysql" if args.mysql else "stand-in",
+        "repeat": args.repeat,
+    }
+
+
+def compare(old, new, threshold):
+    # Prints both runs side by side; returns the names that got slower
+    regressions = []
+    print(f"{'benchmark':<48} {'old (ms)':>10} {'new (ms)':>10} {'change':>8}")
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before = old["results"].get(name)
+        after = new["results"].get(name)
+        if before is None or after is None:
+            only = "new" if before is None else "old"
+            print(f"{name:<48} {'-' if before is None else f'{before * 1000:10.1f}':>10} "
+                  f"{'-' if after is None else f'{after * 1000:10.1f}':>10} {f'({only} only)':>8}")
+            continue
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold and after >= MIN_COMPARED_SECONDS:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {before * 1000:10.1f} {after * 1000:10.1f} {change:+8.1%}{flag}")
+    for label, run in (("old", old), ("new", new)):
+        meta = run.get("meta", {})
+        print(f"{label}: {meta.get('timestamp')} {meta.get('platform')} "
+              f"Pillow {meta.get('pillow')}, {meta.get('database')} database")
+    return regressions
+
+
+def load(path):
+    with open(path) as result_file:
+        return json.load(result_file)
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        regressions = compare(load(args.compare[0]), load(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    run = {"meta": metadata(args), "results": Suite(args).run()}
+    if args.output:
+        with open(args.output, "w") as result_file:
+            json.dump(run, result_file, indent=2, sort_keys=True)
+        print(f"Wrote {len(run['results'])} results to {args.output}")
+    if args.baseline:
+        regressions = compare(load(args.baseline), run, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+
+# Image bytes stored in MySQL as a sequence of image_chunks rows instead of
+# one LONGBLOB value, so no single packet comes near max_allowed_packet and
+# neither side ever holds more than one chunk of a file. A file is uploaded
+# one chunk per transaction; an upload that stops half way keeps its chunks
+# and the next upload of the same, unchanged file carries on after the last
+# one. Completed uploads are referenced from images.upload_id.
+
+# Rows of 1 MB stay under the 4 MB max_allowed_packet of older servers
+CHUNK_SIZE = 1024 * 1024
+
+# Unfinished uploads older than this are deleted at startup
+STALE_UPLOAD_SECONDS = 7 * 24 * 3600
+
+# file_key identifies the local file an unfinished upload came from; it is
+# cleared once the upload is complete
+UPLOADS_TABLE = """
+    CREATE TABLE IF NOT EXISTS uploads (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        file_key CHAR(64) NULL,
+        size BIGINT NOT NULL,
+        chunk_size INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_uploads_file_key (file_key)
+    )
+"""
+
+IMAGE_CHUNKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS image_chunks (
+        upload_id INT NOT NULL,
+        seq INT NOT NULL,
+        data MEDIUMBLOB NOT NULL,
+        PRIMARY KEY (upload_id, seq),
+        FOREIGN KEY (upload_id) REFERENCES uploads(id) ON DELETE CASCADE
+    )
+"""
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+def create_tables(cursor):
+    cursor.execute(UPLOADS_TABLE)
+    cursor.execute(IMAGE_CHUNKS_TABLE)
+
+
+def file_key(path):
+    # Same path, size and modification time: treated as the same content
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def upload_file(pool, path, progress=None):
+    # Copies path into image_chunks and returns the upload id, to be passed
+    # to finish_upload in the transaction that points an image at it.
+    # progress(done_bytes, total_bytes) is called after every chunk and may
+    # raise TransferCancelled to stop; the chunks sent so far are kept.
+    size = os.path.getsize(path)
+    key = file_key(path)
+    upload_id = pool.execute(
+        "INSERT INTO uploads (file_key, size, chunk_size) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+        (key, size, CHUNK_SIZE)
+    )
+    # An earlier attempt may have used another chunk size
+    chunk_size, sent = pool.fetchone(
+        "SELECT u.chunk_size, COUNT(c.seq) FROM uploads u "
+        "LEFT JOIN image_chunks c ON c.upload_id = u.id WHERE u.id = %s GROUP BY u.id",
+        (upload_id,)
+    )
+    # Chunks are committed in order, so the count is the next sequence number
+    seq = sent
+    done = min(size, seq * chunk_size)
+    if progress:
+        progress(done, size)
+    with open(path, "rb") as source:
+        source.seek(done)
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            # The upsert makes a retry after a lost commit acknowledgement safe
+            pool.execute(
+                "INSERT INTO image_chunks (upload_id, seq, data) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE data = VALUES(data)",
+                (upload_id, seq, data)
+            )
+            seq += 1
+            done += len(data)
+            if progress:
+                progress(done, size)
+    return upload_id
+
+
+def finish_upload(cursor, upload_id):
+    # Runs in the caller's transaction; the upload can no longer be resumed
+    # into, so a later upload of the same file starts a new one
+    cursor.execute("SELECT size FROM uploads WHERE id = %s FOR UPDATE", (upload_id,))
+    row = cursor.fetchone()
+    cursor.execute(
+        "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM image_chunks WHERE upload_id = %s",
+        (upload_id,)
+    )
+    if row is None or cursor.fetchone()[0] != row[0]:
+        raise ValueError(f"Upload {upload_id} is incomplete")
+    cursor.execute("UPDATE uploads SET file_key = NULL WHERE id = %s", (upload_id,))
+
+
+def release_upload(cursor, upload_id):
+    # Chunks go with it through ON DELETE CASCADE
+    cursor.execute("DELETE FROM uploads WHERE id = %s", (upload_id,))
+
+
+def iter_chunks(pool, upload_id):
+    # One chunk per query, so only one chunk is buffered at a time
+    seq = 0
+    while True:
+        row = pool.fetchone(
+            "SELECT data FROM image_chunks WHERE upload_id = %s AND seq = %s",
+            (upload_id, seq)
+        )
+        if row is None:
+            return
+        yield row[0]
+        seq += 1
+
+
+def download(pool, upload_id, destination, progress=None):
+    # Writes the upload's bytes to the destination file object
+    row = pool.fetchone("SELECT size FROM uploads WHERE id = %s", (upload_id,))
+    if row is None:
+        raise ValueError(f"Upload {upload_id} does not exist")
+    size = row[0]
+    done = 0
+    if progress:
+        progress(done, size)
+    for data in iter_chunks(pool, upload_id):
+        destination.write(data)
+        done += len(data)
+        if progress:
+            progress(done, size)
+    if done != size:
+        raise ValueError(f"Upload {upload_id} has {done} of {size} bytes")
+
+
+def discard_stale_uploads(pool):
+    def discard(cursor):
+        cursor.execute(
+            "DELETE FROM uploads WHERE file_key IS NOT NULL "
+            "AND created_at < NOW() - INTERVAL %s SECOND",
+            (STALE_UPLOAD_SECONDS,)
+        )
+        return cursor.rowcount
+    return pool.run(discard)
@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import blob_chunks
+
+# Files younger than this may belong to a save that has not committed yet
+ORPHAN_GRACE_SECONDS = 3600
+
+# Read size when hashing or copying whole files
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    # Content-addressed files keyed by SHA-256, sharded two levels deep
+    # (ab/cd/abcd...) so no directory grows past a few thousand entries.
+    # Identical content is stored once; MySQL keeps the hash and a reference
+    # count in the blobs table.
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def digest_file(path):
+        # Hashes a file without reading it into memory at once
+        sha = hashlib.sha256()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(COPY_BLOCK_SIZE), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def put(self, data, digest=None):
+        digest = digest or self.digest(data)
+        self.write(digest, lambda tmp_file: tmp_file.write(data))
+        return digest
+
+    def put_file(self, source_path, digest=None):
+        # Copies a file into the store block by block
+        digest = digest or self.digest_file(source_path)
+
+        def copy(tmp_file):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, tmp_file, COPY_BLOCK_SIZE)
+        self.write(digest, copy)
+        return digest
+
+    def write(self, digest, fill):
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file in the same directory, then rename over the
+        # final name, so readers never see a partially written blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                fill(tmp_file)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, digest):
+        with open(self.path_for(digest), "rb") as blob_file:
+            return blob_file.read()
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_digests(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.startswith(".tmp-"):
+                    yield filename
+
+
+# Reference counting against the blobs table. The reference helpers run
+# inside the caller's transaction; the blobs row lock serializes them with
+# concurrent saves and deletes of the same content. Files are only removed
+# by delete_unreferenced, after the transaction that dropped the last
+# reference has committed: a rollback must find its file still there.
+
+def add_reference(cursor, store, data):
+    digest = store.digest(data)
+    cursor.execute(
+        "INSERT INTO blobs (hash, size, ref_count) VALUES (%s, %s, 1) "
+        "ON DUPLICATE KEY UPDATE ref_count = ref_count + 1",
+        (digest, len(data))
+    )
+    # Written while holding the row lock, after a concurrent release may
+    # have removed the file
+    store.put(data, digest)
+    return digest
+
+
+def add_file_reference(cursor, store, path):
+    # add_reference for content that is in a file rather than in memory
+    digest = store.digest_file(path)
+    cursor.execute(
+        "INSERT INTO blobs (hash, size, ref_count) VALUES (%s, %s, 1) "
+        "ON DUPLICATE KEY UPDATE ref_count = ref_count + 1",
+        (digest, os.path.getsize(path))
+    )
+    store.put_file(path, digest)
+    return digest
+
+
+def release_reference(cursor, digest):
+    # True when this was the last reference; pass the digest to
+    # delete_unreferenced once the transaction has committed
+    cursor.execute("SELECT ref_count FROM blobs WHERE hash = %s FOR UPDATE", (digest,))
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    if row[0] <= 1:
+        cursor.execute("DELETE FROM blobs WHERE hash = %s", (digest,))
+        return True
+    cursor.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = %s", (digest,))
+    return False
+
+
+def delete_unreferenced(pool, store, digests):
+    # Removes the files of blobs that have no blobs row. Locking the missing
+    # row (a gap lock) holds off a concurrent add_reference of the same
+    # content until the file is gone, so it then writes the file afresh.
+    for digest in digests:
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM blobs WHERE hash = %s FOR UPDATE", (digest,))
+            if cursor.fetchone() is None:
+                store.delete(digest)
+
+
+def migrate(pool, store):
+    # Move inline images.image_data and chunked uploads into the store, one
+    # row at a time
+    migrated = 0
+    last_id = 0
+    while True:
+        row = pool.fetchone(
+            "SELECT id, upload_id FROM images WHERE id > %s AND blob_hash IS NULL ORDER BY id LIMIT 1",
+            (last_id,)
+        )
+        if row is None:
+            break
+        last_id, upload_id = row
+        if upload_id is not None:
+            migrated += migrate_upload(pool, store, last_id, upload_id)
+            continue
+        with pool.cursor() as cursor:
+            cursor.execute(
+                "SELECT image_data FROM images WHERE id = %s AND blob_hash IS NULL FOR UPDATE",
+                (last_id,)
+            )
+            result = cursor.fetchone()
+            if result is None or result[0] is None:
+                continue
+            digest = add_reference(cursor, store, result[0])
+            cursor.execute(
+                "UPDATE images SET blob_hash = %s, image_data = NULL WHERE id = %s",
+                (digest, last_id)
+            )
+        migrated += 1
+    return migrated
+
+
+def migrate_upload(pool, store, image_id, upload_id):
+    # The chunks are streamed to a temporary file in the store first, so the
+    # row lock is only held while the file is hashed and moved into place.
+    # Returns 1 if the image now points at the store, 0 if it changed meanwhile.
+    fd, tmp_path = tempfile.mkstemp(dir=store.root, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            try:
+                blob_chunks.download(pool, upload_id, tmp_file)
+                error = None
+            except ValueError as err:
+                # Possibly released by a concurrent update; checked below
+                error = err
+        with pool.cursor() as cursor:
+            cursor.execute(
+                "SELECT upload_id FROM images WHERE id = %s AND blob_hash IS NULL FOR UPDATE",
+                (image_id,)
+            )
+            result = cursor.fetchone()
+            if result is None or result[0] != upload_id:
+                return 0
+            if error is not None:
+                raise error
+            digest = add_file_reference(cursor, store, tmp_path)
+            cursor.execute(
+                "UPDATE images SET blob_hash = %s, upload_id = NULL WHERE id = %s",
+                (digest, image_id)
+            )
+            blob_chunks.release_upload(cursor, upload_id)
+        return 1
+    finally:
+        os.remove(tmp_path)
+
+
+def collect_garbage(pool, store):
+    # Drop blobs no image points at, then files with no blobs row (left
+    # behind by a crash between writing the file and committing)
+    with pool.cursor() as cursor:
+        cursor.execute("""
+            SELECT b.hash FROM blobs b
+            LEFT JOIN images i ON i.blob_hash = b.hash
+            WHERE i.id IS NULL
+        """)
+        candidates = [row[0] for row in cursor.fetchall()]
+        unreferenced = []
+        for digest in candidates:
+            # Re-check under the row lock in case a save picked it up meanwhile
+            cursor.execute(
+                "DELETE FROM blobs WHERE hash = %s "
+                "AND NOT EXISTS (SELECT 1 FROM images WHERE blob_hash = %s)",
+                (digest, digest)
+            )
+            if cursor.rowcount:
+                unreferenced.append(digest)
+        cursor.execute("""
+            UPDATE blobs b
+            SET ref_count = (SELECT COUNT(*) FROM images i WHERE i.blob_hash = b.hash)
+        """)
+
+    known = {row[0] for row in pool.fetchall("SELECT hash FROM blobs")}
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    orphans = [
+        digest for digest in store.iter_digests()
+        if digest not in known and os.path.getmtime(store.path_for(digest)) < cutoff
+    ]
+    # Both re-checked under lock: a save may have referenced them since
+    delete_unreferenced(pool, store, unreferenced + orphans)
+    return len(unreferenced), len(orphans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the content-addressed image store")
+    parser.add_argument("command", choices=["migrate", "gc"])
+    parser.add_argument("--store", help="blob store directory (defaults to demo3.BLOB_STORE_DIR)")
+    args = parser.parse_args()
+
+    import demo3
+    root = args.store or demo3.BLOB_STORE_DIR
+    if not root:
+        parser.error("no blob store directory configured; pass --store")
+
+    handler = demo3.DatabaseHandler()
+    handler.connect()
+    store = BlobStore(root)
+    try:
+        if args.command == "migrate":
+            print(f"Moved {migrate(handler.pool, store)} images into {root}")
+        else:
+            blobs, files = collect_garbage(handler.pool, store)
+            print(f"Removed {blobs} unreferenced blobs and {files} orphaned files")
+    finally:
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
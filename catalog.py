@@ -0,0 +1,72 @@
+# Schema of the file catalog used by main.py and batch.py: one images row
+# per (folder, filename) and an edits row per applied filter
+
+from db_pool import schema_version, set_schema_version
+
+# Raise when create_tables or migrate_schema change, so databases recorded
+# at an older version run them again
+SCHEMA_VERSION = 1
+
+
+def ensure_schema(cursor):
+    # Startup path: a database already at SCHEMA_VERSION costs one SELECT
+    # instead of the CREATE TABLE and information_schema round trips
+    current = schema_version(cursor, "catalog")
+    if current is not None and current >= SCHEMA_VERSION:
+        return
+    create_tables(cursor)
+    set_schema_version(cursor, "catalog", SCHEMA_VERSION)
+
+
+def create_tables(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS images (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        filename VARCHAR(255) NOT NULL,
+        filepath VARCHAR(255) NOT NULL,
+        original_path VARCHAR(255) NOT NULL,
+        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        description TEXT,
+        UNIQUE KEY uq_images_file (filename, filepath)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS edits (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        image_id INT,
+        filter_name VARCHAR(50) NOT NULL,
+        edit_path VARCHAR(255) NOT NULL,
+        date_edited TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
+    )
+    ''')
+
+    migrate_schema(cursor)
+
+
+def migrate_schema(cursor):
+    # Tables created before the (filename, filepath) unique index may hold
+    # duplicate rows; fold them into the oldest one, then add the index
+    cursor.execute('''
+    SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'images' AND INDEX_NAME = 'uq_images_file'
+    ''')
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute('''
+    UPDATE edits e
+    JOIN images dup ON e.image_id = dup.id
+    JOIN (
+        SELECT filename, filepath, MIN(id) AS keep_id
+        FROM images
+        GROUP BY filename, filepath
+    ) k ON dup.filename = k.filename AND dup.filepath = k.filepath
+    SET e.image_id = k.keep_id
+    WHERE dup.id <> k.keep_id
+    ''')
+    cursor.execute('''
+    DELETE dup FROM images dup
+    JOIN images keep ON dup.filename = keep.filename AND dup.filepath = keep.filepath AND dup.id > keep.id
+    ''')
+    cursor.execute("ALTER TABLE images ADD UNIQUE INDEX uq_images_file (filename, filepath)")
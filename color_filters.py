@@ -0,0 +1,79 @@
+from PIL import Image
+
+# Color matrices are 12-tuples in the layout Pillow's Image.convert expects:
+# (rr, rg, rb, r_offset, gr, gg, gb, g_offset, br, bg, bb, b_offset)
+IDENTITY = (
+    1.0, 0.0, 0.0, 0.0,
+    0.0, 1.0, 0.0, 0.0,
+    0.0, 0.0, 1.0, 0.0,
+)
+
+SEPIA = (
+    0.393, 0.769, 0.189, 0.0,
+    0.349, 0.686, 0.168, 0.0,
+    0.272, 0.534, 0.131, 0.0,
+)
+
+# ITU-R 601-2 luma, the same weights Pillow uses for convert("L")
+GRAYSCALE = (
+    0.299, 0.587, 0.114, 0.0,
+    0.299, 0.587, 0.114, 0.0,
+    0.299, 0.587, 0.114, 0.0,
+)
+
+
+def channel_mixer(red=(1.0, 0.0, 0.0), green=(0.0, 1.0, 0.0), blue=(0.0, 0.0, 1.0),
+                  offset=(0.0, 0.0, 0.0)):
+    # Each output channel is a weighted sum of the input (r, g, b) plus an offset
+    return (
+        red[0], red[1], red[2], offset[0],
+        green[0], green[1], green[2], offset[1],
+        blue[0], blue[1], blue[2], offset[2],
+    )
+
+
+def tint_matrix(color, strength=0.5):
+    # Blend the luma of each pixel towards the given RGB color
+    r, g, b = color
+    keep = 1.0 - strength
+    return (
+        keep + strength * 0.299 * r / 255, strength * 0.587 * r / 255, strength * 0.114 * r / 255, 0.0,
+        strength * 0.299 * g / 255, keep + strength * 0.587 * g / 255, strength * 0.114 * g / 255, 0.0,
+        strength * 0.299 * b / 255, strength * 0.587 * b / 255, keep + strength * 0.114 * b / 255, 0.0,
+    )
+
+
+def compose_matrices(outer, inner):
+    # Returns the matrix equivalent to applying `inner` first, then `outer`
+    result = []
+    for row in range(3):
+        o = outer[row * 4:row * 4 + 4]
+        for col in range(3):
+            result.append(sum(o[k] * inner[k * 4 + col] for k in range(3)))
+        result.append(sum(o[k] * inner[k * 4 + 3] for k in range(3)) + o[3])
+    return tuple(result)
+
+
+def apply_color_matrix(image, matrix):
+    # Pillow only runs matrix conversion on RGB input, so route other
+    # modes through RGB and carry any alpha channel across untouched
+    alpha = None
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        alpha = image.getchannel("A")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    result = image.convert("RGB", matrix)
+
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
+
+
+def sepia(image):
+    return apply_color_matrix(image, SEPIA)
+
+
+def grayscale(image):
+    return apply_color_matrix(image, GRAYSCALE)
@@ -0,0 +1,303 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import mysql.connector
+import mysql.connector.aio
+from mysql.connector import errorcode
+
+import tracing
+from db_pool import LOST_CONNECTION_ERRORS
+
+
+class AsyncConnectionPool:
+    # Small pool over mysql.connector.aio, which ships no pooling of its own.
+    # Connections are opened lazily up to pool_size and reused; callers wait
+    # for a free one instead of failing when all are busy.
+    def __init__(self, config, pool_size=5):
+        self.config = dict(config)
+        self.pool_size = pool_size
+        self.idle = None
+        self.opened = 0
+        self.lock = None
+
+    async def ensure_database(self):
+        try:
+            conn = await mysql.connector.aio.connect(**self.config)
+        except mysql.connector.Error as err:
+            if err.errno != errorcode.ER_BAD_DB_ERROR:
+                raise
+            server_config = dict(self.config)
+            database = server_config.pop("database")
+            conn = await mysql.connector.aio.connect(**server_config)
+            cursor = await conn.cursor()
+            await cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+            await cursor.close()
+        await conn.close()
+
+    async def acquire(self):
+        # Queue and lock are created here so they bind to the running loop
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.idle.empty() and self.opened < self.pool_size:
+                self.opened += 1
+                try:
+                    return await mysql.connector.aio.connect(**self.config)
+                except Exception:
+                    self.opened -= 1
+                    raise
+        conn = await self.idle.get()
+        if not await conn.is_connected():
+            await conn.reconnect(attempts=3, delay=1)
+        return conn
+
+    def release(self, conn):
+        self.idle.put_nowait(conn)
+
+    async def discard(self, conn):
+        self.opened -= 1
+        try:
+            await conn.close()
+        except mysql.connector.Error:
+            pass
+
+    @asynccontextmanager
+    async def cursor(self, buffered=True):
+        # One transaction: committed on success, rolled back on error
+        conn = await self.acquire()
+        try:
+            cursor = await conn.cursor(buffered=buffered)
+            try:
+                with tracing.span("db.query"):
+                    yield cursor
+                with tracing.span("db.commit"):
+                    await conn.commit()
+            finally:
+                await cursor.close()
+        except BaseException as err:
+            if isinstance(err, mysql.connector.Error) and err.errno in LOST_CONNECTION_ERRORS:
+                await self.discard(conn)
+                raise
+            try:
+                await conn.rollback()
+            except mysql.connector.Error:
+                await self.discard(conn)
+            else:
+                self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    async def run(self, func, retries=1):
+        # Awaits func(cursor) in its own transaction, retrying on a fresh
+        # connection if the server went away during the call
+        for attempt in range(retries + 1):
+            try:
+                async with self.cursor() as cursor:
+                    return await func(cursor)
+            except mysql.connector.Error as err:
+                if err.errno not in LOST_CONNECTION_ERRORS or attempt == retries:
+                    raise
+
+    async def execute(self, query, params=()):
+        async def execute_query(cursor):
+            await cursor.execute(query, params)
+            return cursor.lastrowid
+        return await self.run(execute_query)
+
+    async def fetchone(self, query, params=()):
+        async def fetch(cursor):
+            await cursor.execute(query, params)
+            return await cursor.fetchone()
+        return await self.run(fetch)
+
+    async def fetchall(self, query, params=()):
+        async def fetch(cursor):
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+        return await self.run(fetch)
+
+    async def close(self):
+        while self.idle is not None and not self.idle.empty():
+            await self.discard(self.idle.get_nowait())
+
+
+# Async versions of main.py's catalog and edit-logging queries
+
+async def register_image(pool, filename, filepath, original_path):
+    # Upsert on the (filename, filepath) unique index; LAST_INSERT_ID(id)
+    # makes lastrowid the existing row's id when the file is already known
+    return await pool.execute(
+        "INSERT INTO images (filename, filepath, original_path) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+        (filename, filepath, original_path)
+    )
+
+
+# Rows per multi-row INSERT and per IN (...) lookup when registering a folder
+REGISTER_CHUNK_SIZE = 500
+
+
+async def register_images(pool, filepath, filenames):
+    # Registers a whole folder in one transaction and returns
+    # {filename: images.id}
+    async def upsert(cursor):
+        image_ids = {}
+        for start in range(0, len(filenames), REGISTER_CHUNK_SIZE):
+            chunk = filenames[start:start + REGISTER_CHUNK_SIZE]
+            await cursor.executemany(
+                "INSERT INTO images (filename, filepath, original_path) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE id = id",
+                [(filename, filepath, os.path.join(filepath, filename)) for filename in chunk]
+            )
+            placeholders = ", ".join(["%s"] * len(chunk))
+            await cursor.execute(
+                f"SELECT filename, id FROM images WHERE filepath = %s AND filename IN ({placeholders})",
+                (filepath, *chunk)
+            )
+            image_ids.update(await cursor.fetchall())
+        return image_ids
+    if not filenames:
+        return {}
+    return await pool.run(upsert)
+
+
+async def log_edit(pool, image_id, filter_name, edit_path):
+    return await pool.execute(
+        "INSERT INTO edits (image_id, filter_name, edit_path) VALUES (%s, %s, %s)",
+        (image_id, filter_name, edit_path)
+    )
+
+
+async def fetch_edit_history(pool, image_id):
+    return await pool.fetchall(
+        """
+        SELECT filter_name, date_edited
+        FROM edits
+        WHERE image_id = %s
+        ORDER BY date_edited DESC
+        """,
+        (image_id,)
+    )
+
+
+# Edit log writes failing with these are retried later; the server went
+# away or could not be reached, so the same rows may well go in next time
+EDIT_LOG_RETRY_ERRORS = LOST_CONNECTION_ERRORS | {
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_CONNECTION_ERROR,
+}
+
+
+class EditLogWriter:
+    # Group commit for the edits table: rows are buffered and written with a
+    # single executemany per transaction once batch_size rows are waiting,
+    # or max_delay seconds after the first one. All methods run on the
+    # event loop that owns the pool.
+    def __init__(self, pool, batch_size=200, max_delay=0.5):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        # Rows stay here until their transaction commits
+        self.pending = []
+        self.lock = None
+        self.timer = None
+        self.tasks = set()
+
+    def add(self, image_id, filter_name, edit_path):
+        # Stamped here rather than by the column default so buffered rows
+        # keep the time of the edit; TIMESTAMP has whole seconds
+        date_edited = datetime.now().replace(microsecond=0)
+        self.pending.append((image_id, filter_name, edit_path, date_edited))
+        if len(self.pending) >= self.batch_size:
+            # A running flush keeps going until the buffer is empty
+            if not self.tasks:
+                self.start_flush()
+        elif self.timer is None:
+            self.schedule(self.max_delay)
+
+    def schedule(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.get_running_loop().call_later(delay, self.start_flush)
+
+    def start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        task = asyncio.get_running_loop().create_task(self.flush_in_background())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush_in_background(self):
+        try:
+            await self.flush()
+        except mysql.connector.Error as err:
+            # Only connection failures get here; rows are kept and tried
+            # again after another delay
+            print(f"Could not write edit log, will retry: {err}")
+            if self.timer is None:
+                self.schedule(self.max_delay)
+
+    async def flush(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                try:
+                    await self.write(batch)
+                except mysql.connector.Error as err:
+                    if err.errno in EDIT_LOG_RETRY_ERRORS:
+                        raise
+                    # Some row will never go in (e.g. its image was deleted
+                    # meanwhile); find it rather than block every later row
+                    await self.write_one_by_one(len(batch))
+                else:
+                    del self.pending[:len(batch)]
+
+    async def write_one_by_one(self, count):
+        # Rows leave the buffer as they commit or are dropped, so a retry
+        # after a connection failure does not write any of them twice
+        for _ in range(count):
+            row = self.pending[0]
+            try:
+                await self.write([row])
+            except mysql.connector.Error as err:
+                if err.errno in EDIT_LOG_RETRY_ERRORS:
+                    raise
+                image_id, filter_name, edit_path, _ = row
+                print(f"Dropped edit log row for image {image_id} ({filter_name}, {edit_path}): {err}")
+            del self.pending[0]
+
+    async def write(self, rows):
+        async def insert(cursor):
+            await cursor.executemany(
+                "INSERT INTO edits (image_id, filter_name, edit_path, date_edited) "
+                "VALUES (%s, %s, %s, %s)",
+                rows
+            )
+        await self.pool.run(insert)
+
+    async def fetch_history(self, image_id):
+        # Same rows as fetch_edit_history, plus the ones still buffered. The
+        # lock keeps a flush from committing rows between the two reads.
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            buffered = [
+                (filter_name, date_edited)
+                for row_image_id, filter_name, _, date_edited in reversed(self.pending)
+                if row_image_id == image_id
+            ]
+            return buffered + list(await fetch_edit_history(self.pool, image_id))
+
+    async def close(self):
+        await self.flush()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
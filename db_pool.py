@@ -0,0 +1,168 @@
+import threading
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errorcode, pooling
+
+import tracing
+
+# Client errors raised when the server has dropped the connection mid-call
+LOST_CONNECTION_ERRORS = {
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+}
+
+
+# One row per schema (name) with the version it was last brought up to
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        name VARCHAR(64) PRIMARY KEY,
+        version INT NOT NULL
+    )
+"""
+
+
+def create_database(config):
+    server_config = dict(config)
+    database = server_config.pop("database")
+    conn = mysql.connector.connect(**server_config)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.close()
+    conn.close()
+
+
+def schema_version(cursor, name):
+    # None for a database that has never recorded one
+    try:
+        cursor.execute("SELECT version FROM schema_version WHERE name = %s", (name,))
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        return None
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_schema_version(cursor, name, version):
+    cursor.execute(SCHEMA_VERSION_TABLE)
+    cursor.execute(
+        "INSERT INTO schema_version (name, version) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE version = VALUES(version)",
+        (name, version)
+    )
+
+
+class ConnectionPool:
+    # Thread-safe access to MySQL. Every operation checks a connection out of
+    # a mysql.connector pool and hands it back when done, so the same pool can
+    # be shared by the UI thread, background loaders and batch workers.
+    def __init__(self, config, pool_size=5, pool_name=None, checkout_timeout=30):
+        self.config = dict(config)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        # mysql.connector raises instead of waiting when the pool is empty,
+        # so callers queue on this semaphore for a free connection instead
+        self.slots = threading.BoundedSemaphore(pool_size)
+        pool_name = pool_name or f"{config['database']}_pool"
+        try:
+            self.pool = pooling.MySQLConnectionPool(pool_name=pool_name, pool_size=pool_size, **self.config)
+        except mysql.connector.Error as err:
+            # Create the configured database if the server does not have it
+            # yet; checked here rather than with a probe connection up front
+            if err.errno != errorcode.ER_BAD_DB_ERROR:
+                raise
+            create_database(config)
+            self.pool = pooling.MySQLConnectionPool(pool_name=pool_name, pool_size=pool_size, **self.config)
+
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(timeout=self.checkout_timeout):
+            raise pooling.PoolError("Timed out waiting for a database connection")
+        try:
+            # get_connection pings the checked-out connection and reconnects
+            # it if the server closed it while it sat idle in the pool
+            conn = self.pool.get_connection()
+            try:
+                yield conn
+            finally:
+                try:
+                    conn.close()
+                except mysql.connector.Error:
+                    # A broken connection still goes back to the pool and is
+                    # reconnected on its next checkout
+                    pass
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def cursor(self, buffered=True):
+        # One transaction: committed on success, rolled back on error
+        with self.connection() as conn:
+            cursor = conn.cursor(buffered=buffered)
+            try:
+                with tracing.span("db.query"):
+                    yield cursor
+                with tracing.span("db.commit"):
+                    conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except mysql.connector.Error:
+                    pass
+                raise
+            finally:
+                cursor.close()
+
+    def run(self, func, retries=1):
+        # Runs func(cursor) in its own transaction, retrying on a fresh
+        # connection if the server went away during the call
+        for attempt in range(retries + 1):
+            try:
+                with self.cursor() as cursor:
+                    return func(cursor)
+            except mysql.connector.Error as err:
+                if err.errno not in LOST_CONNECTION_ERRORS or attempt == retries:
+                    raise
+
+    def execute(self, query, params=()):
+        def execute_query(cursor):
+            cursor.execute(query, params)
+            return cursor.lastrowid
+        return self.run(execute_query)
+
+    def fetchone(self, query, params=()):
+        def fetch(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchone()
+        return self.run(fetch)
+
+    def fetchall(self, query, params=()):
+        def fetch(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return self.run(fetch)
+
+    def close(self):
+        # Holding every slot waits out the operations still running, so all
+        # pool_size connections are idle; each is checked out and closed for
+        # real instead of being handed back. Later checkouts fail with
+        # PoolError since the pool is left empty.
+        held = 0
+        while held < self.pool_size and self.slots.acquire(timeout=self.checkout_timeout):
+            held += 1
+        try:
+            for _ in range(held):
+                try:
+                    conn = self.pool.get_connection()
+                except mysql.connector.Error:
+                    # Could not be reconnected; nothing left open to close
+                    continue
+                try:
+                    conn.disconnect()
+                except mysql.connector.Error:
+                    pass
+        finally:
+            for _ in range(held):
+                self.slots.release()
@@ -1,116 +1,414 @@
 import sys
 import os
-import io
+import shutil
+import tempfile
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, 
-                             QWidget, QLabel, QFileDialog, QScrollArea, QFrame, QGridLayout,
-                             QMessageBox, QSlider, QComboBox, QGroupBox, QDialog)
-from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QBrush
-from PyQt5.QtCore import Qt, QSize, QBuffer, QRect
-import mysql.connector
-from PIL import Image, ImageEnhance, ImageFilter
+                             QWidget, QLabel, QFileDialog, QFrame, QGridLayout,
+                             QMessageBox, QSlider, QComboBox, QGroupBox, QDialog, QListView,
+                             QProgressDialog)
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QBrush, QKeySequence
+from PyQt5.QtCore import Qt, QSize, QBuffer, QRect, QTimer, QAbstractListModel, QModelIndex, pyqtSignal
+from qt_image import pil_to_qimage
+from render_scheduler import RenderScheduler, RenderCancelled
+import blob_chunks
+from blob_chunks import TransferCancelled
+from blob_store import BlobStore, COPY_BLOCK_SIZE, add_file_reference, delete_unreferenced, release_reference
+import startup
+import tracing
+from trace_panel import TraceStatus
+
+# The MySQL driver, asyncio and Pillow (through edit_pipeline and history)
+# are imported where they are used, so the main window paints without
+# waiting for them; startup.StartupTask loads them in the background
+
+# Database configuration
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "mini@123",
+    "database": "photo_editor_db"
+}
+
+# Directory of the content-addressed blob store; None keeps image bytes
+# inline in images.image_data. Move existing rows with
+# `python blob_store.py migrate` after setting it.
+BLOB_STORE_DIR = None
+
+# Connections shared by the UI thread and background loaders
+DB_POOL_SIZE = 5
+
+# Raise when DatabaseHandler.create_tables changes, so databases recorded at
+# an older version run it again
+SCHEMA_VERSION = 1
+
+# Smallest preview proxy, in device pixels, that interactive edits run on
+PROXY_MIN_SIZE = (1024, 768)
+
+# Rows fetched per keyset query and thumbnails kept decoded by the browser
+IMAGE_PAGE_SIZE = 100
+THUMBNAIL_CACHE_SIZE = 500
+
+# Quiet period after the last resize event before the preview is re-rendered
+RESIZE_DEBOUNCE_MS = 80
+
+# Editor sliders: operation, label, range, and the operation argument for a
+# slider position. Position 0 leaves the image as it is; a slider applies
+# its operation once when released and returns to 0. Blur is in tenths of
+# a percent of the image's longer side.
+SLIDERS = [
+    ("brightness", "Brightness", -100, 100, lambda value: 1 + value / 100),
+    ("contrast", "Contrast", -100, 100, lambda value: 1 + value / 100),
+    ("saturation", "Saturation", -100, 100, lambda value: 1 + value / 100),
+    ("blur", "Blur radius", 0, 50, lambda value: value / 1000),
+]
+
+# Memory for undo snapshots of the preview; older states beyond it are
+# written to a temporary directory, or dropped if spilling is off
+HISTORY_MEMORY_BUDGET = 256 * 1024 * 1024
+HISTORY_SPILL_TO_DISK = True
 
 class DatabaseHandler:
     def __init__(self):
-        self.connection = None
-        self.connect_to_database()
-        self.create_tables()
-        
+        self.pool = None
+        self.runner = None
+        # With a blob store, image bytes live on disk keyed by SHA-256 and
+        # images.blob_hash points at them; otherwise they stay in image_data
+        self.blob_store = BlobStore(BLOB_STORE_DIR) if BLOB_STORE_DIR else None
+    
     def connect_to_database(self):
+        # Runs on the startup thread while the main window is already up
+        startup.preload()
+        from db_pool import ConnectionPool
+        # Pooled connections are handed out per operation, so the handler can
+        # be shared with worker threads and reconnects on its own
+        pool = ConnectionPool(DB_CONFIG, pool_size=DB_POOL_SIZE)
         try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="mini@123",
-                database="photo_editor_db"
-            )
-            print("Connected to database successfully")
-        except mysql.connector.Error as err:
-            if err.errno == mysql.connector.errorcode.ER_BAD_DB_ERROR:
-                # Database doesn't exist, create it
-                temp_conn = mysql.connector.connect(
-                    host="localhost",
-                    user="root",
-                    password="m"
+            self.create_tables(pool)
+            discarded = blob_chunks.discard_stale_uploads(pool)
+        except Exception:
+            pool.close()
+            raise
+        print("Connected to database successfully")
+        if discarded:
+            print(f"Discarded {discarded} unfinished uploads")
+        # Needed as soon as the user opens the browser or an image
+        startup.preload(["edit_pipeline", "history"])
+        return pool
+    
+    def connect(self):
+        # Blocking, for scripts that use the handler without a window
+        self.pool = self.connect_to_database()
+    
+    def start(self, pool):
+        # On the UI thread, once connect_to_database has succeeded
+        from async_bridge import AsyncRunner
+        self.pool = pool
+        # Event loop thread for blob transfers, backfills and the browser's
+        # queries; they run this handler's blocking methods through submit()
+        self.runner = AsyncRunner()
+        # Rows without a thumbnail show the placeholder until this reaches them
+        self.submit(self.backfill_thumbnails)
+    
+    def submit(self, func, *args, on_done=None, on_error=None):
+        # Runs one of the blocking methods of this handler on a worker
+        # thread, so the UI never waits on MySQL; on_done(result) or
+        # on_error(error) is called on the UI thread
+        import asyncio
+        return self.runner.submit(asyncio.to_thread(func, *args), on_done=on_done, on_error=on_error)
+    
+    def create_tables(self, pool):
+        from db_pool import schema_version, set_schema_version
+        with pool.cursor() as cursor:
+            # A database already at SCHEMA_VERSION needs none of the statements below
+            current = schema_version(cursor, "demo3")
+            if current is not None and current >= SCHEMA_VERSION:
+                return
+            # Chunked image bytes, see blob_chunks
+            blob_chunks.create_tables(cursor)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    image_data LONGBLOB NULL,
+                    image_type VARCHAR(10) NOT NULL,
+                    blob_hash CHAR(64) NULL,
+                    upload_id INT NULL,
+                    INDEX idx_images_blob_hash (blob_hash)
                 )
-                cursor = temp_conn.cursor()
-                cursor.execute("CREATE DATABASE photo_editor_db")
-                cursor.close()
-                temp_conn.close()
-                
-                # Connect to the newly created database
-                self.connection = mysql.connector.connect(
-                    host="localhost",
-                    user="root",
-                    password="",
-                    database="photo_editor_db"
+            """)
+            # Tables created before the blob store have no blob_hash column
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'images' AND COLUMN_NAME = 'blob_hash'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("""
+                    ALTER TABLE images
+                    MODIFY image_data LONGBLOB NULL,
+                    ADD COLUMN blob_hash CHAR(64) NULL,
+                    ADD INDEX idx_images_blob_hash (blob_hash)
+                """)
+            # ... and tables created before chunked uploads no upload_id
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'images' AND COLUMN_NAME = 'upload_id'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("ALTER TABLE images ADD COLUMN upload_id INT NULL")
+            # One row per distinct blob in the store, with its reference count
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash CHAR(64) PRIMARY KEY,
+                    size BIGINT NOT NULL,
+                    ref_count INT NOT NULL
+                )
+            """)
+            # Thumbnails live in their own table so listing never touches image_data
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS image_thumbnails (
+                    image_id INT PRIMARY KEY,
+                    thumbnail MEDIUMBLOB NOT NULL,
+                    FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
                 )
-                print("Created and connected to database successfully")
+            """)
+            set_schema_version(cursor, "demo3", SCHEMA_VERSION)
+    
+    def backfill_thumbnails(self):
+        missing_ids = [row[0] for row in self.pool.fetchall("""
+            SELECT i.id FROM images i
+            LEFT JOIN image_thumbnails t ON t.image_id = i.id
+            WHERE t.image_id IS NULL
+        """)]
+        
+        # One image at a time so the backfill never holds more than one
+        created = 0
+        for image_id in missing_ids:
+            try:
+                image = self.download_image(image_id)
+                if image is None:
+                    continue
+                try:
+                    thumbnail = self.make_thumbnail(image[2])
+                finally:
+                    os.remove(image[2])
+            except (OSError, ValueError) as err:
+                print(f"Could not create thumbnail for image {image_id}: {err}")
+                continue
+            with self.pool.cursor() as cursor:
+                self.store_thumbnail(cursor, image_id, thumbnail)
+            created += 1
+        if created:
+            print(f"Created {created} missing thumbnails")
+    
+    def store_thumbnail(self, cursor, image_id, thumbnail):
+        cursor.execute(
+            "INSERT INTO image_thumbnails (image_id, thumbnail) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE thumbnail = VALUES(thumbnail)",
+            (image_id, thumbnail)
+        )
+    
+    def make_thumbnail(self, path):
+        import edit_pipeline
+        size = edit_pipeline.THUMBNAIL_SIZE
+        return edit_pipeline.make_thumbnail(edit_pipeline.load_preview(path, size), size)
+    
+    # Image files are read and written in blocks, never whole: into the blob
+    # store when there is one, otherwise as image_chunks rows. progress is
+    # called as progress(done_bytes, total_bytes) from the calling thread and
+    # may raise TransferCancelled; an interrupted chunked upload resumes the
+    # next time the same file is uploaded.
+    
+    def upload(self, path, progress):
+        if self.blob_store:
+            return None
+        return blob_chunks.upload_file(self.pool, path, progress)
+    
+    def save_image(self, name, path, image_type, thumbnail=None, progress=None):
+        if thumbnail is None:
+            thumbnail = self.make_thumbnail(path)
+        upload_id = self.upload(path, progress)
+        with self.pool.cursor() as cursor:
+            if self.blob_store:
+                digest = add_file_reference(cursor, self.blob_store, path)
+                query = "INSERT INTO images (name, image_type, blob_hash) VALUES (%s, %s, %s)"
+                cursor.execute(query, (name, image_type, digest))
             else:
-                print(f"Database connection error: {err}")
-                sys.exit(1)
-    
-    def create_tables(self):
-        cursor = self.connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS images (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                image_data LONGBLOB NOT NULL,
-                image_type VARCHAR(10) NOT NULL
-            )
-        """)
-        self.connection.commit()
-        cursor.close()
-    
-    def save_image(self, name, image_data, image_type):
-        cursor = self.connection.cursor()
-        query = "INSERT INTO images (name, image_data, image_type) VALUES (%s, %s, %s)"
-        cursor.execute(query, (name, image_data, image_type))
-        self.connection.commit()
-        image_id = cursor.lastrowid
-        cursor.close()
+                blob_chunks.finish_upload(cursor, upload_id)
+                query = "INSERT INTO images (name, image_type, upload_id) VALUES (%s, %s, %s)"
+                cursor.execute(query, (name, image_type, upload_id))
+            image_id = cursor.lastrowid
+            self.store_thumbnail(cursor, image_id, thumbnail)
         return image_id
     
-    def update_image(self, image_id, image_data):
-        cursor = self.connection.cursor()
-        query = "UPDATE images SET image_data = %s WHERE id = %s"
-        cursor.execute(query, (image_data, image_id))
-        self.connection.commit()
-        cursor.close()
-    
-    def get_all_images(self):
-        cursor = self.connection.cursor()
-        query = "SELECT id, name, image_data, image_type FROM images"
-        cursor.execute(query)
-        images = cursor.fetchall()
-        cursor.close()
-        return images
-    
-    def get_image_by_id(self, image_id):
-        cursor = self.connection.cursor()
-        query = "SELECT id, name, image_data, image_type FROM images WHERE id = %s"
-        cursor.execute(query, (image_id,))
-        image = cursor.fetchone()
-        cursor.close()
-        return image
+    def update_image(self, image_id, path, thumbnail=None, progress=None):
+        if thumbnail is None:
+            thumbnail = self.make_thumbnail(path)
+        upload_id = self.upload(path, progress)
+        released = False
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT blob_hash, upload_id FROM images WHERE id = %s FOR UPDATE", (image_id,))
+            row = cursor.fetchone()
+            if self.blob_store:
+                digest = add_file_reference(cursor, self.blob_store, path)
+                query = "UPDATE images SET image_data = NULL, blob_hash = %s, upload_id = NULL WHERE id = %s"
+                cursor.execute(query, (digest, image_id))
+            else:
+                blob_chunks.finish_upload(cursor, upload_id)
+                query = "UPDATE images SET image_data = NULL, blob_hash = NULL, upload_id = %s WHERE id = %s"
+                cursor.execute(query, (upload_id, image_id))
+            if row and row[0] and self.blob_store:
+                released = release_reference(cursor, row[0])
+            if row and row[1]:
+                blob_chunks.release_upload(cursor, row[1])
+            self.store_thumbnail(cursor, image_id, thumbnail)
+        if released:
+            delete_unreferenced(self.pool, self.blob_store, [row[0]])
+    
+    def get_image_page(self, after_id=0, limit=100):
+        # Keyset pagination: metadata only, resumes after the last id seen
+        query = "SELECT id, name, image_type FROM images WHERE id > %s ORDER BY id LIMIT %s"
+        return self.pool.fetchall(query, (after_id, limit))
+    
+    def get_thumbnails(self, image_ids):
+        if not image_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(image_ids))
+        query = f"SELECT image_id, thumbnail FROM image_thumbnails WHERE image_id IN ({placeholders})"
+        return dict(self.pool.fetchall(query, tuple(image_ids)))
+    
+    def download_image(self, image_id, progress=None):
+        # Copies the image into a temporary file and returns
+        # (id, name, path, type); the caller deletes the file
+        query = "SELECT name, image_type, blob_hash, upload_id FROM images WHERE id = %s"
+        row = self.pool.fetchone(query, (image_id,))
+        if row is None:
+            return None
+        name, image_type, blob_hash, upload_id = row
+        fd, path = tempfile.mkstemp(prefix="photo-", suffix=f".{image_type}")
+        try:
+            with os.fdopen(fd, "wb") as destination:
+                if upload_id:
+                    blob_chunks.download(self.pool, upload_id, destination, progress)
+                elif blob_hash:
+                    if not self.blob_store:
+                        raise RuntimeError(f"Image {image_id} is in the blob store but BLOB_STORE_DIR is not set")
+                    with open(self.blob_store.path_for(blob_hash), "rb") as source:
+                        shutil.copyfileobj(source, destination, COPY_BLOCK_SIZE)
+                else:
+                    # Saved before chunked uploads, still inline in one value
+                    row = self.pool.fetchone("SELECT image_data FROM images WHERE id = %s", (image_id,))
+                    destination.write(row[0])
+        except BaseException:
+            os.remove(path)
+            raise
+        return image_id, name, path, image_type
     
     def delete_image(self, image_id):
-        cursor = self.connection.cursor()
-        query = "DELETE FROM images WHERE id = %s"
-        cursor.execute(query, (image_id,))
-        self.connection.commit()
-        cursor.close()
+        released = False
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT blob_hash, upload_id FROM images WHERE id = %s FOR UPDATE", (image_id,))
+            row = cursor.fetchone()
+            cursor.execute("DELETE FROM images WHERE id = %s", (image_id,))
+            if row and row[0] and self.blob_store:
+                released = release_reference(cursor, row[0])
+            if row and row[1]:
+                blob_chunks.release_upload(cursor, row[1])
+        # Drop the stored file once no other image shares its content
+        if released:
+            delete_unreferenced(self.pool, self.blob_store, [row[0]])
     
     def close(self):
-        if self.connection:
-            self.connection.close()
+        if self.runner:
+            self.runner.stop()
+        if self.pool:
+            self.pool.close()
+
+
+class TransferDialog(QProgressDialog):
+    # Progress of an upload or download running on the database thread.
+    # report() is the progress callback handed to DatabaseHandler; it is
+    # called on that thread and raises TransferCancelled after Cancel.
+    progressed = pyqtSignal(object, object)
+    
+    def __init__(self, label, parent):
+        super().__init__(label, "Cancel", 0, 1000, parent)
+        self.label = label
+        self.cancel_requested = False
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.canceled.connect(self.request_cancel)
+        self.progressed.connect(self.show_progress)
+    
+    def request_cancel(self):
+        self.cancel_requested = True
+    
+    def report(self, done, total):
+        if self.cancel_requested:
+            raise TransferCancelled()
+        self.progressed.emit(done, total)
+    
+    def show_progress(self, done, total):
+        self.setValue(int(1000 * done / total) if total else 1000)
+        self.setLabelText(f"{self.label}\n{done / 2**20:.1f} of {total / 2**20:.1f} MB")
+
+
+def run_transfer(db_handler, parent, label, work, on_done, on_error=None, resumable=False):
+    # Runs work(progress) off the UI thread behind a TransferDialog; on_done
+    # and on_error are called on the UI thread
+    dialog = TransferDialog(label, parent)
+    dialog.show()
+    
+    def done(result):
+        dialog.close()
+        on_done(result)
+    
+    def failed(err):
+        dialog.close()
+        if on_error is not None:
+            on_error(err)
+        elif isinstance(err, TransferCancelled):
+            if resumable:
+                QMessageBox.information(parent, "Cancelled", f"{label} cancelled. Upload the same file again to resume.")
+        else:
+            QMessageBox.warning(parent, "Transfer Failed", f"{label} failed: {err}")
+    
+    db_handler.submit(work, dialog.report, on_done=done, on_error=failed)
 
             
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db_handler = DatabaseHandler()
+        self.db_connect = startup.StartupTask(self)
         self.init_ui()
+    
+    def connect_database(self):
+        # Called once the window is showing; the buttons stay disabled until
+        # the connection and schema check are done
+        self.statusBar().showMessage("Connecting to the database...")
+        self.db_connect.start(self.db_handler.connect_to_database,
+                              on_done=self.database_ready, on_error=self.database_failed)
+    
+    def database_ready(self, pool):
+        self.db_handler.start(pool)
+        self.statusBar().showMessage("Connected to the database", 5000)
+        self.upload_btn.setEnabled(True)
+        self.select_btn.setEnabled(True)
+    
+    def database_failed(self, err):
+        print(f"Database connection error: {err}")
+        self.statusBar().showMessage("Not connected to the database")
+        reply = QMessageBox.critical(
+            self, "Database Error", f"Connection failed: {err}",
+            QMessageBox.Retry | QMessageBox.Close, QMessageBox.Retry
+        )
+        if reply == QMessageBox.Retry:
+            self.connect_database()
+        else:
+            self.close()
         
     def init_ui(self):
         self.setWindowTitle("Photo Editor App")
@@ -128,6 +426,8 @@ class MainWindow(QMainWindow):
         self.select_btn = QPushButton("Select from Database")
         
         self.select_btn.setStyleSheet("background-color: green; color: white;")
+        self.upload_btn.setEnabled(False)
+        self.select_btn.setEnabled(False)
 
 
         # Set button size
@@ -164,19 +464,198 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Invalid File", "Only JPG and PNG files are allowed.")
                 return
                 
-            # Read image data
-            with open(file_path, 'rb') as file:
-                image_data = file.read()
-            
-            # Save to database
-            self.db_handler.save_image(filename, image_data, file_extension)
-            QMessageBox.information(self, "Success", "Image uploaded successfully!")
+            # Streamed to the database in chunks
+            run_transfer(
+                self.db_handler, self, f"Uploading {filename}",
+                lambda progress: self.db_handler.save_image(filename, file_path, file_extension, progress=progress),
+                on_done=lambda _: QMessageBox.information(self, "Success", "Image uploaded successfully!"),
+                resumable=True
+            )
     
     def view_database(self):
         self.database_view = DatabaseView(self.db_handler)
         self.database_view.show()
         self.hide()
 
+class ImageListModel(QAbstractListModel):
+    # Rows are fetched a page at a time as the view scrolls; thumbnails are
+    # requested only when the view asks to paint an item. Both queries run
+    # on the handler's worker threads and land here when they finish.
+    # After each page query, whether it returned rows or failed
+    fetched = pyqtSignal()
+    failed = pyqtSignal(object)
+    
+    def __init__(self, db_handler, parent=None):
+        super().__init__(parent)
+        self.db_handler = db_handler
+        self.rows = []
+        self.row_by_id = {}
+        self.exhausted = False
+        self.fetching = False
+        self.fetch_again = False
+        self.thumbnails = OrderedDict()
+        self.pending_thumbnails = set()
+        self.loading_thumbnails = set()
+        # Bumped by refresh() so results of queries sent before it are dropped
+        self.generation = 0
+        
+        from edit_pipeline import THUMBNAIL_SIZE
+        self.placeholder = QPixmap(*THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor(230, 230, 230))
+        
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.timeout.connect(self.load_pending_thumbnails)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.fetching
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if self.fetching:
+            return
+        self.fetching = True
+        after_id = self.rows[-1][0] if self.rows else 0
+        generation = self.generation
+        self.db_handler.submit(
+            self.db_handler.get_image_page, after_id, IMAGE_PAGE_SIZE,
+            on_done=lambda page: self.add_page(generation, page),
+            on_error=lambda err: self.fetch_failed(generation, err)
+        )
+    
+    def add_page(self, generation, page):
+        if generation != self.generation:
+            return
+        self.fetching = False
+        if len(page) < IMAGE_PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            for row, image in enumerate(page, first):
+                self.rows.append(image)
+                self.row_by_id[image[0]] = row
+            self.endInsertRows()
+        self.fetched.emit()
+        if self.fetch_again:
+            self.load_new_rows()
+    
+    def fetch_failed(self, generation, err):
+        if generation != self.generation:
+            return
+        # Stop paging until the next refresh rather than retry in a loop
+        self.fetching = False
+        self.fetch_again = False
+        self.exhausted = True
+        self.fetched.emit()
+        self.failed.emit(err)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image_id, name, image_type = self.rows[index.row()]
+        
+        if role == Qt.DisplayRole:
+            return name
+        if role == Qt.ToolTipRole:
+            return f"ID: {image_id}\nName: {name}\nType: {image_type}"
+        if role == Qt.UserRole:
+            return image_id
+        if role == Qt.DecorationRole:
+            pixmap = self.thumbnails.get(image_id)
+            if pixmap is not None:
+                self.thumbnails.move_to_end(image_id)
+                return pixmap
+            # Batch every visible item requested in this paint into one query
+            if image_id not in self.loading_thumbnails:
+                self.pending_thumbnails.add(image_id)
+                self.thumbnail_timer.start(0)
+            return self.placeholder
+        return None
+    
+    def load_pending_thumbnails(self):
+        image_ids = list(self.pending_thumbnails)
+        self.pending_thumbnails.clear()
+        self.loading_thumbnails.update(image_ids)
+        generation = self.generation
+        
+        def load():
+            # Decoded on the worker too; QImage, unlike QPixmap, may be
+            # made off the UI thread
+            thumbnails = self.db_handler.get_thumbnails(image_ids)
+            return {image_id: QImage.fromData(data) for image_id, data in thumbnails.items() if data}
+        
+        self.db_handler.submit(
+            load,
+            on_done=lambda images: self.show_thumbnails(generation, image_ids, images),
+            on_error=lambda err: self.thumbnails_failed(generation, image_ids, err)
+        )
+    
+    def show_thumbnails(self, generation, image_ids, images):
+        if generation != self.generation:
+            return
+        self.loading_thumbnails.difference_update(image_ids)
+        for image_id in image_ids:
+            image = images.get(image_id)
+            pixmap = QPixmap.fromImage(image) if image is not None else self.placeholder
+            self.thumbnails[image_id] = pixmap
+            row = self.row_by_id.get(image_id)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+        
+        while len(self.thumbnails) > THUMBNAIL_CACHE_SIZE:
+            self.thumbnails.popitem(last=False)
+    
+    def thumbnails_failed(self, generation, image_ids, err):
+        if generation != self.generation:
+            return
+        # Placeholders stay; the items are asked for again when repainted
+        self.loading_thumbnails.difference_update(image_ids)
+        print(f"Could not load thumbnails: {err}")
+    
+    def refresh(self):
+        self.beginResetModel()
+        self.generation += 1
+        self.rows = []
+        self.row_by_id = {}
+        self.exhausted = False
+        self.fetching = False
+        self.fetch_again = False
+        self.thumbnails.clear()
+        self.pending_thumbnails.clear()
+        self.loading_thumbnails.clear()
+        self.endResetModel()
+    
+    def load_new_rows(self):
+        # New uploads have the largest ids, so the keyset query picks them up;
+        # a page query already running may have been sent before the upload
+        # committed, so another one follows it
+        self.fetch_again = self.fetching
+        self.exhausted = False
+        self.fetchMore()
+    
+    def invalidate_thumbnail(self, image_id):
+        self.thumbnails.pop(image_id, None)
+        row = self.row_by_id.get(image_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+    
+    def remove_image(self, image_id):
+        row = self.row_by_id.get(image_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.thumbnails.pop(image_id, None)
+        self.row_by_id = {image[0]: i for i, image in enumerate(self.rows)}
+        self.endRemoveRows()
+
 class DatabaseView(QMainWindow):
     def __init__(self, db_handler):
         super().__init__()
@@ -185,6 +664,7 @@ class DatabaseView(QMainWindow):
         self.load_images()
         
     def init_ui(self):
+        from edit_pipeline import THUMBNAIL_SIZE
         self.setWindowTitle("Database Images")
         self.setGeometry(100, 100, 900, 700)
         
@@ -192,6 +672,10 @@ class DatabaseView(QMainWindow):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         
+        # Per-stage timings, with PHOTO_TRACE set (see tracing.py)
+        if tracing.enabled:
+            self.statusBar().addPermanentWidget(TraceStatus(), 1)
+        
         # Create main layout
         main_layout = QVBoxLayout(central_widget)
         
@@ -207,20 +691,56 @@ class DatabaseView(QMainWindow):
         
         main_layout.addLayout(top_layout)
         
-        # Scroll area for images
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
+        # Image browser; only visible items are painted or given thumbnails
+        self.model = ImageListModel(self.db_handler, self)
+        self.model.modelReset.connect(self.update_empty_state)
+        self.model.rowsInserted.connect(self.update_empty_state)
+        self.model.rowsRemoved.connect(self.update_empty_state)
+        self.model.fetched.connect(self.update_empty_state)
+        self.model.failed.connect(self.show_fetch_error)
+        
+        self.image_view = QListView()
+        self.image_view.setViewMode(QListView.IconMode)
+        self.image_view.setResizeMode(QListView.Adjust)
+        self.image_view.setMovement(QListView.Static)
+        self.image_view.setUniformItemSizes(True)
+        self.image_view.setIconSize(QSize(*THUMBNAIL_SIZE))
+        self.image_view.setGridSize(QSize(THUMBNAIL_SIZE[0] + 20, THUMBNAIL_SIZE[1] + 40))
+        self.image_view.setSelectionMode(QListView.SingleSelection)
+        self.image_view.setModel(self.model)
+        
+        self.no_images_label = QLabel("No images found in database")
+        self.no_images_label.setAlignment(Qt.AlignCenter)
+        self.no_images_label.hide()
+        
+        main_layout.addWidget(self.image_view)
+        main_layout.addWidget(self.no_images_label)
+        
+        # Buttons acting on the selected image
+        buttons_layout = QHBoxLayout()
+        self.view_btn = QPushButton("Read")
+        self.update_btn = QPushButton("Update")
+        self.delete_btn = QPushButton("Delete")
+        self.delete_btn.setStyleSheet("background-color: red; color: white;")  # Change button color to red
+        self.select_btn = QPushButton("Select")
         
-        self.scroll_content = QWidget()
-        self.scroll_layout = QVBoxLayout(self.scroll_content)
+        buttons_layout.addWidget(self.view_btn)
+        buttons_layout.addWidget(self.update_btn)
+        buttons_layout.addWidget(self.delete_btn)
+        buttons_layout.addWidget(self.select_btn)
         
-        self.scroll_area.setWidget(self.scroll_content)
-        main_layout.addWidget(self.scroll_area)
+        main_layout.addLayout(buttons_layout)
         
         # Connect signals
         self.back_btn.clicked.connect(self.go_back)
         self.refresh_btn.clicked.connect(self.load_images)
         self.upload_btn.clicked.connect(self.upload_image)
+        
+        self.view_btn.clicked.connect(lambda: self.with_selected_image(self.view_image))
+        self.update_btn.clicked.connect(lambda: self.with_selected_image(self.update_image))
+        self.delete_btn.clicked.connect(lambda: self.with_selected_image(self.delete_image))
+        self.select_btn.clicked.connect(lambda: self.with_selected_image(self.edit_image))
+        self.image_view.doubleClicked.connect(lambda index: self.edit_image(index.data(Qt.UserRole)))
     
     def go_back(self):
         # Show main window and close this one
@@ -243,97 +763,51 @@ class DatabaseView(QMainWindow):
                 QMessageBox.warning(self, "Invalid File", "Only JPG and PNG files are allowed.")
                 return
                 
-            # Read image data
-            with open(file_path, 'rb') as file:
-                image_data = file.read()
-            
-            # Save to database
-            self.db_handler.save_image(filename, image_data, file_extension)
-            QMessageBox.information(self, "Success", "Image uploaded successfully!")
-            self.load_images()
+            # Streamed to the database in chunks
+            run_transfer(
+                self.db_handler, self, f"Uploading {filename}",
+                lambda progress: self.db_handler.save_image(filename, file_path, file_extension, progress=progress),
+                on_done=self.on_uploaded,
+                resumable=True
+            )
+    
+    def on_uploaded(self, _):
+        QMessageBox.information(self, "Success", "Image uploaded successfully!")
+        self.model.load_new_rows()
             
     def load_images(self):
-        # Clear existing images
-        while self.scroll_layout.count():
-            child = self.scroll_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        
-        # Get all images from database
-        images = self.db_handler.get_all_images()
-        
-        if not images:
-            no_images_label = QLabel("No images found in database")
-            no_images_label.setAlignment(Qt.AlignCenter)
-            self.scroll_layout.addWidget(no_images_label)
+        # Drop everything fetched so far; the view pulls the first page back in
+        self.model.refresh()
+        if self.model.canFetchMore():
+            self.model.fetchMore()
+        self.update_empty_state()
+    
+    def update_empty_state(self):
+        # Not while the first page is still on its way
+        empty = self.model.rowCount() == 0 and not self.model.fetching
+        self.no_images_label.setVisible(empty)
+        self.image_view.setVisible(not empty)
+    
+    def show_fetch_error(self, err):
+        QMessageBox.warning(self, "Database Error", f"Could not load images: {err}")
+    
+    def with_selected_image(self, action):
+        indexes = self.image_view.selectionModel().selectedIndexes()
+        if not indexes:
+            QMessageBox.warning(self, "No Selection", "Please select an image first.")
             return
-            
-        # Add each image to the layout
-        for image_id, name, image_data, image_type in images:
-            image_frame = QFrame()
-            image_frame.setFrameShape(QFrame.Box)
-            image_frame.setLineWidth(1)
-            
-            frame_layout = QHBoxLayout(image_frame)
-            
-            # Image thumbnail
-            image = QImage.fromData(image_data)
-            pixmap = QPixmap.fromImage(image)
-            pixmap = pixmap.scaled(200, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            
-            image_label = QLabel()
-            image_label.setPixmap(pixmap)
-            image_label.setFixedSize(200, 150)
-            image_label.setAlignment(Qt.AlignCenter)
-            
-            # Image details
-            details_layout = QVBoxLayout()
-            id_label = QLabel(f"ID: {image_id}")
-            name_label = QLabel(f"Name: {name}")
-            type_label = QLabel(f"Type: {image_type}")
-            
-            details_layout.addWidget(id_label)
-            details_layout.addWidget(name_label)
-            details_layout.addWidget(type_label)
-            details_layout.addStretch()
-            
-            # Buttons
-            buttons_layout = QVBoxLayout()
-            view_btn = QPushButton("Read")
-            update_btn = QPushButton("Update")
-            
-            delete_btn = QPushButton("Delete")
-            delete_btn = QPushButton("Delete")
-            delete_btn.setStyleSheet("background-color: red; color: white;")  # Change button color to red
-
-
-            select_btn = QPushButton("Select")
-            
-            buttons_layout.addWidget(view_btn)
-            buttons_layout.addWidget(update_btn)
-            buttons_layout.addWidget(delete_btn)
-            buttons_layout.addWidget(select_btn)
-            buttons_layout.addStretch()
-            
-            # Connect button signals
-            view_btn.clicked.connect(lambda checked, img_id=image_id: self.view_image(img_id))
-            update_btn.clicked.connect(lambda checked, img_id=image_id: self.update_image(img_id))
-            delete_btn.clicked.connect(lambda checked, img_id=image_id: self.delete_image(img_id))
-            select_btn.clicked.connect(lambda checked, img_id=image_id: self.edit_image(img_id))
-            
-            # Add to frame layout
-            frame_layout.addWidget(image_label)
-            frame_layout.addLayout(details_layout)
-            frame_layout.addStretch()
-            frame_layout.addLayout(buttons_layout)
-            
-            # Add frame to scroll layout
-            self.scroll_layout.addWidget(image_frame)
+        action(indexes[0].data(Qt.UserRole))
     
     def view_image(self, image_id):
-        image = self.db_handler.get_image_by_id(image_id)
+        run_transfer(
+            self.db_handler, self, "Downloading image",
+            lambda progress: self.db_handler.download_image(image_id, progress),
+            on_done=self.show_image
+        )
+    
+    def show_image(self, image):
         if image:
-            _, name, image_data, image_type = image
+            _, name, path, image_type = image
             
             # Create a new window to display the image
             view_dialog = QDialog(self)
@@ -342,9 +816,12 @@ class DatabaseView(QMainWindow):
             
             layout = QVBoxLayout(view_dialog)
             
-            # Display image
-            qimg = QImage.fromData(image_data)
-            pixmap = QPixmap.fromImage(qimg)
+            # Display image, decoded at display size
+            import edit_pipeline
+            try:
+                pixmap = QPixmap.fromImage(pil_to_qimage(edit_pipeline.load_preview(path, (700, 500))))
+            finally:
+                os.remove(path)
             
             image_label = QLabel()
             image_label.setPixmap(pixmap.scaled(
@@ -375,14 +852,17 @@ class DatabaseView(QMainWindow):
                 QMessageBox.warning(self, "Invalid File", "Only JPG and PNG files are allowed.")
                 return
                 
-            # Read image data
-            with open(file_path, 'rb') as file:
-                image_data = file.read()
-            
-            # Update in database
-            self.db_handler.update_image(image_id, image_data)
-            QMessageBox.information(self, "Success", "Image updated successfully!")
-            self.load_images()
+            # Streamed to the database in chunks
+            run_transfer(
+                self.db_handler, self, f"Uploading {file_info.fileName()}",
+                lambda progress: self.db_handler.update_image(image_id, file_path, progress=progress),
+                on_done=lambda _: self.on_updated(image_id),
+                resumable=True
+            )
+    
+    def on_updated(self, image_id):
+        QMessageBox.information(self, "Success", "Image updated successfully!")
+        self.model.invalidate_thumbnail(image_id)
     
     def delete_image(self, image_id):
         confirm = QMessageBox.question(
@@ -392,26 +872,76 @@ class DatabaseView(QMainWindow):
         )
         
         if confirm == QMessageBox.Yes:
-            self.db_handler.delete_image(image_id)
-            QMessageBox.information(self, "Success", "Image deleted successfully!")
-            self.load_images()
+            self.db_handler.submit(
+                self.db_handler.delete_image, image_id,
+                on_done=lambda _: self.on_deleted(image_id),
+                on_error=lambda err: QMessageBox.warning(self, "Delete Failed", f"Could not delete image: {err}")
+            )
+    
+    def on_deleted(self, image_id):
+        self.model.remove_image(image_id)
+        QMessageBox.information(self, "Success", "Image deleted successfully!")
     
     def edit_image(self, image_id):
-        image = self.db_handler.get_image_by_id(image_id)
+        run_transfer(
+            self.db_handler, self, "Downloading image",
+            lambda progress: self.db_handler.download_image(image_id, progress),
+            on_done=self.open_editor
+        )
+    
+    def open_editor(self, image):
         if image:
             self.editor = ImageEditor(self.db_handler, image)
             self.editor.show()
             self.hide()
 
 class ImageEditor(QMainWindow):
-    def __init__(self, db_handler, image_data):
+    def __init__(self, db_handler, image):
+        from PIL import Image
+        from history import EditHistory
         super().__init__()
         self.db_handler = db_handler
-        self.image_id, self.image_name, self.original_image_data, self.image_type = image_data
-        
-        # Convert image data to PIL Image
-        self.original_pil_image = Image.open(io.BytesIO(self.original_image_data))
-        self.current_pil_image = self.original_pil_image.copy()
+        # original_path is DatabaseHandler.download_image's temporary copy,
+        # deleted when the editor closes
+        self.image_id, self.image_name, self.original_path, self.image_type = image
+        
+        # Opened lazily: pixels are only decoded in full when saving, the
+        # preview proxy is decoded at reduced size straight from the file
+        self.original_pil_image = Image.open(self.original_path)
+        
+        # Interactive edits run on a downscaled proxy; the recorded operation
+        # list is replayed on the full-resolution original only when saving
+        self.operations = []
+        self.proxy_base = None
+        self.proxy_bounds = (0, 0)
+        self.proxy_stale = True
+        
+        # current_pil_image is the proxy with rendered_operations applied,
+        # as last delivered by the render thread
+        self.current_pil_image = None
+        self.rendered_operations = []
+        
+        # Undone operations, most recent last; the rendered states for undo
+        # and redo come from the history instead of re-running the edits
+        self.redo_operations = []
+        self.history = EditHistory(HISTORY_MEMORY_BUDGET, spill=HISTORY_SPILL_TO_DISK)
+        
+        self.render_scheduler = RenderScheduler(self)
+        self.render_scheduler.finished.connect(self.show_render)
+        self.render_scheduler.failed.connect(self.show_render_error)
+        
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.on_resize_settled)
+        
+        # Live slider preview, see start_live
+        self.live = None
+        self.live_name = None
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(0)
+        self.live_timer.timeout.connect(self.show_live_frame)
         
         self.init_ui()
         self.update_preview()
@@ -424,6 +954,10 @@ class ImageEditor(QMainWindow):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         
+        # Per-stage timings, with PHOTO_TRACE set (see tracing.py)
+        if tracing.enabled:
+            self.statusBar().addPermanentWidget(TraceStatus(), 1)
+        
         # Create main layout
         main_layout = QHBoxLayout(central_widget)
         
@@ -459,19 +993,25 @@ class ImageEditor(QMainWindow):
         
         options_layout.addWidget(rotate_flip_group)
         
-        # Adjust Brightness & Contrast
-        adjust_group = QGroupBox("Adjust Brightness & Contrast")
-        adjust_layout = QVBoxLayout(adjust_group)
-        
-        self.brightness_btn = QPushButton("Increase Brightness")
-        self.darkness_btn = QPushButton("Decrease Brightness")
-        self.contrast_inc_btn = QPushButton("Increase Contrast")
-        self.contrast_dec_btn = QPushButton("Decrease Contrast")
-        
-        adjust_layout.addWidget(self.brightness_btn)
-        adjust_layout.addWidget(self.darkness_btn)
-        adjust_layout.addWidget(self.contrast_inc_btn)
-        adjust_layout.addWidget(self.contrast_dec_btn)
+        # Adjustment sliders
+        adjust_group = QGroupBox("Adjust")
+        adjust_layout = QGridLayout(adjust_group)
+        
+        self.sliders = {}
+        self.slider_labels = {}
+        for row, (name, label, minimum, maximum, _) in enumerate(SLIDERS):
+            slider = QSlider(Qt.Horizontal)
+            slider.setRange(minimum, maximum)
+            slider.setValue(0)
+            slider.setMinimumWidth(150)
+            value_label = QLabel()
+            value_label.setMinimumWidth(50)
+            adjust_layout.addWidget(QLabel(label), row, 0)
+            adjust_layout.addWidget(slider, row, 1)
+            adjust_layout.addWidget(value_label, row, 2)
+            self.sliders[name] = slider
+            self.slider_labels[name] = value_label
+            self.show_slider_value(name)
         
         options_layout.addWidget(adjust_group)
         
@@ -505,7 +1045,13 @@ class ImageEditor(QMainWindow):
         self.save_btn = QPushButton("Save to Database")
         self.cancel_btn = QPushButton("Cancel")
         self.reset_btn = QPushButton("Reset Changes")
+        self.undo_btn = QPushButton("Undo")
+        self.redo_btn = QPushButton("Redo")
+        self.undo_btn.setShortcut(QKeySequence.Undo)
+        self.redo_btn.setShortcut(QKeySequence.Redo)
         
+        buttons_layout.addWidget(self.undo_btn)
+        buttons_layout.addWidget(self.redo_btn)
         buttons_layout.addWidget(self.save_btn)
         buttons_layout.addWidget(self.reset_btn)
         buttons_layout.addWidget(self.cancel_btn)
@@ -523,10 +1069,10 @@ class ImageEditor(QMainWindow):
         self.flip_h_btn.clicked.connect(lambda: self.flip_image("horizontal"))
         self.flip_v_btn.clicked.connect(lambda: self.flip_image("vertical"))
         
-        self.brightness_btn.clicked.connect(lambda: self.adjust_brightness(1.2))
-        self.darkness_btn.clicked.connect(lambda: self.adjust_brightness(0.8))
-        self.contrast_inc_btn.clicked.connect(lambda: self.adjust_contrast(1.2))
-        self.contrast_dec_btn.clicked.connect(lambda: self.adjust_contrast(0.8))
+        for name, slider in self.sliders.items():
+            slider.sliderPressed.connect(lambda name=name: self.start_live(name))
+            slider.valueChanged.connect(lambda _, name=name: self.slider_moved(name))
+            slider.sliderReleased.connect(lambda name=name: self.commit_slider(name))
         
         self.grayscale_btn.clicked.connect(self.convert_to_grayscale)
         
@@ -536,101 +1082,229 @@ class ImageEditor(QMainWindow):
         
         self.save_btn.clicked.connect(self.save_image)
         self.reset_btn.clicked.connect(self.reset_image)
+        self.undo_btn.clicked.connect(self.undo)
+        self.redo_btn.clicked.connect(self.redo)
         self.cancel_btn.clicked.connect(self.cancel_editing)
     
     def update_preview(self):
-        # Convert PIL image to QPixmap for display
-        img_bytes = io.BytesIO()
-        self.current_pil_image.save(img_bytes, format=self.image_type.upper())
-        img_bytes.seek(0)
-        
-        img_data = img_bytes.read()
-        qimg = QImage.fromData(img_data)
-        pixmap = QPixmap.fromImage(qimg)
-        
-        # Scale pixmap to fit the label while maintaining aspect ratio
-        scaled_pixmap = pixmap.scaled(
-            self.preview_frame.width() - 20,
-            self.preview_frame.height() - 20,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
+        target_width = max(1, self.preview_frame.width() - 20)
+        target_height = max(1, self.preview_frame.height() - 20)
+        
+        if self.proxy_base is None or self.proxy_stale:
+            # Rebuild the proxy from the original and replay every operation
+            original = self.original_path
+            bounds = self.preview_bounds()
+            base, start = None, 0
+        elif self.operations[:len(self.rendered_operations)] == self.rendered_operations:
+            # Continue from the last rendered state
+            original = bounds = None
+            base, start = self.current_pil_image, len(self.rendered_operations)
+        else:
+            # Undo, or a new edit after undo: start from the history, or
+            # replay from the proxy if it has nothing stored
+            original = bounds = None
+            base, start = self.proxy_base, None
+        operations = list(self.operations)
+        current, current_operations = self.current_pil_image, self.rendered_operations
+        history = self.history
+        
+        def render(is_cancelled):
+            import edit_pipeline
+            proxy = None
+            image = base
+            done = start
+            if original is not None:
+                proxy = image = edit_pipeline.load_preview(original, bounds)
+                history.reset(proxy)
+            elif done is None:
+                image, done = history.restore(operations, current, current_operations, base)
+            # Operations queued while a render was running are fused here
+            for step in edit_pipeline.compile_operations(operations[done:]):
+                if is_cancelled():
+                    raise RenderCancelled()
+                image = edit_pipeline.apply_step(image, step)
+            history.record(operations, image)
+            
+            # Scale to fit the label while maintaining aspect ratio
+            with tracing.span("pixmap.scale"):
+                qimage = pil_to_qimage(image).scaled(
+                    target_width,
+                    target_height,
+                    Qt.KeepAspectRatio,
+                    Qt.SmoothTransformation
+                )
+            return proxy, bounds, operations, image, qimage
         
-        self.image_label.setPixmap(scaled_pixmap)
+        self.render_scheduler.request(render)
     
-    def rotate_image(self, degrees):
-        self.current_pil_image = self.current_pil_image.rotate(degrees, expand=True)
+    def show_render(self, result):
+        proxy, bounds, rendered_operations, image, qimage = result
+        if proxy is not None:
+            self.proxy_base = proxy
+            self.proxy_bounds = bounds
+            self.proxy_stale = False
+        self.rendered_operations = rendered_operations
+        self.current_pil_image = image
+        self.image_label.setPixmap(QPixmap.fromImage(qimage))
+        if self.live_name is not None:
+            # A render landed mid-drag; keep previewing on top of it
+            self.start_live(self.live_name)
+            self.show_live_frame()
+    
+    def show_render_error(self, err):
+        QMessageBox.warning(self, "Preview Failed", f"Could not render the preview: {type(err).__name__}: {err}")
+    
+    def preview_bounds(self):
+        ratio = self.devicePixelRatioF()
+        width = max(PROXY_MIN_SIZE[0], int(self.preview_frame.width() * ratio))
+        height = max(PROXY_MIN_SIZE[1], int(self.preview_frame.height() * ratio))
+        return (width, height)
+    
+    def apply_operation(self, name, *args):
+        self.operations.append((name, args))
+        if self.redo_operations:
+            # A new edit after undo abandons the undone steps
+            self.redo_operations = []
+            self.history.discard_after(self.operations)
         self.update_preview()
     
+    def undo(self):
+        if self.operations:
+            self.redo_operations.append(self.operations.pop())
+            self.update_preview()
+    
+    def redo(self):
+        if self.redo_operations:
+            self.operations.append(self.redo_operations.pop())
+            self.update_preview()
+    
+    def rotate_image(self, degrees):
+        self.apply_operation("rotate", degrees)
+    
     def flip_image(self, direction):
-        if direction == "horizontal":
-            self.current_pil_image = self.current_pil_image.transpose(Image.FLIP_LEFT_RIGHT)
+        self.apply_operation("flip", direction)
+    
+    def slider_argument(self, name):
+        for slider_name, _, _, _, argument in SLIDERS:
+            if slider_name == name:
+                return argument(self.sliders[name].value())
+    
+    def show_slider_value(self, name):
+        value = self.sliders[name].value()
+        if name == "blur":
+            # In pixels of the image that will be saved
+            text = f"{self.slider_argument(name) * max(self.original_pil_image.size):.0f} px"
         else:
-            self.current_pil_image = self.current_pil_image.transpose(Image.FLIP_TOP_BOTTOM)
-        self.update_preview()
+            text = f"{value:+d}%"
+        self.slider_labels[name].setText(text)
     
-    def adjust_brightness(self, factor):
-        enhancer = ImageEnhance.Brightness(self.current_pil_image)
-        self.current_pil_image = enhancer.enhance(factor)
-        self.update_preview()
+    def start_live(self, name):
+        # While the slider is held only the displayed bitmap is redrawn,
+        # from a copy of the current preview at label size
+        import edit_pipeline
+        self.live = None
+        if self.current_pil_image is not None:
+            display_size = (max(1, self.preview_frame.width() - 20), max(1, self.preview_frame.height() - 20))
+            self.live = edit_pipeline.LivePreview(edit_pipeline.make_proxy(self.current_pil_image, display_size))
+        self.live_name = name
     
-    def adjust_contrast(self, factor):
-        enhancer = ImageEnhance.Contrast(self.current_pil_image)
-        self.current_pil_image = enhancer.enhance(factor)
-        self.update_preview()
+    def slider_moved(self, name):
+        self.show_slider_value(name)
+        if not self.sliders[name].isSliderDown():
+            # Keyboard steps and clicks on the track apply straight away
+            self.commit_slider(name)
+        elif self.live is not None and not self.live_timer.isActive():
+            # Moves that arrive while a frame is drawn collapse into one
+            self.live_timer.start()
+    
+    def show_live_frame(self):
+        if self.live is None:
+            return
+        name = self.live_name
+        with tracing.span("transform", step="live"):
+            image = self.live.render(name, self.slider_argument(name))
+        self.image_label.setPixmap(QPixmap.fromImage(pil_to_qimage(image)))
+    
+    def commit_slider(self, name):
+        # The exact operation goes into the edit list: rendered on the proxy
+        # now, replayed at full resolution on save
+        slider = self.sliders[name]
+        moved = slider.value() != 0
+        argument = self.slider_argument(name)
+        self.live = self.live_name = None
+        self.live_timer.stop()
+        slider.blockSignals(True)
+        slider.setValue(0)
+        slider.blockSignals(False)
+        self.show_slider_value(name)
+        if moved:
+            self.apply_operation(name, argument)
+        else:
+            # Put back the last render in place of the live frame
+            self.update_preview()
     
     def convert_to_grayscale(self):
-        self.current_pil_image = self.current_pil_image.convert("L").convert("RGB")
-        self.update_preview()
+        self.apply_operation("grayscale")
     
     def apply_filter(self, filter_type):
-        if filter_type == "sepia":
-            # Sepia filter implementation
-            width, height = self.current_pil_image.size
-            pixels = self.current_pil_image.load()
-            
-            sepia_img = Image.new("RGB", (width, height))
-            sepia_pixels = sepia_img.load()
-            
-            for i in range(width):
-                for j in range(height):
-                    r, g, b = pixels[i, j]
-                    tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-                    tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-                    tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-                    
-                    # Ensure values are in valid range
-                    sepia_pixels[i, j] = (
-                        min(255, tr), 
-                        min(255, tg), 
-                        min(255, tb)
-                    )
-            
-            self.current_pil_image = sepia_img
-            
-        elif filter_type == "blur":
-            self.current_pil_image = self.current_pil_image.filter(ImageFilter.BLUR)
-            
-        elif filter_type == "sharpen":
-            self.current_pil_image = self.current_pil_image.filter(ImageFilter.SHARPEN)
-        
-        self.update_preview()
+        self.apply_operation("filter", filter_type)
     
     def save_image(self):
-        # Convert PIL image to bytes
-        img_bytes = io.BytesIO()
-        self.current_pil_image.save(img_bytes, format=self.image_type.upper())
-        img_bytes.seek(0)
-        
-        # Update in database
-        self.db_handler.update_image(self.image_id, img_bytes.read())
+        # Make sure the render thread is no longer touching the original
+        self.render_scheduler.cancel()
+        self.render_scheduler.wait()
+        
+        # Block further edits until the save has landed
+        self.centralWidget().setEnabled(False)
+        self.save_btn.setText("Saving...")
+        operations = list(self.operations)
+        
+        def save(progress):
+            path, thumbnail = self.render_full_resolution(operations)
+            try:
+                self.db_handler.update_image(self.image_id, path, thumbnail, progress)
+            finally:
+                if path != self.original_path:
+                    os.remove(path)
+        
+        # Rendering, encoding and the chunked upload all happen off the UI thread
+        run_transfer(
+            self.db_handler, self, f"Saving {self.image_name}", save,
+            on_done=self.on_saved, on_error=self.on_save_failed
+        )
+    
+    def render_full_resolution(self, operations):
+        import edit_pipeline
+        if not operations:
+            return self.original_path, None
+        # Render the edits once at full resolution, encoded straight to a file
+        with tracing.span("decode"):
+            self.original_pil_image.load()
+        full_image = edit_pipeline.render_full_resolution(self.original_pil_image, operations)
+        fd, path = tempfile.mkstemp(prefix="photo-", suffix=f".{self.image_type}")
+        os.close(fd)
+        with tracing.span("encode"):
+            full_image.save(path, format=edit_pipeline.pil_format(self.image_type))
+        return path, edit_pipeline.make_thumbnail(full_image, edit_pipeline.THUMBNAIL_SIZE)
+    
+    def on_saved(self, _):
         QMessageBox.information(self, "Success", "Image saved successfully!")
         
         # Return to database view
         self.go_back()
     
+    def on_save_failed(self, err):
+        self.centralWidget().setEnabled(True)
+        self.save_btn.setText("Save to Database")
+        if isinstance(err, TransferCancelled):
+            return
+        QMessageBox.warning(self, "Save Failed", f"Could not save image: {err}")
+    
     def reset_image(self):
-        self.current_pil_image = self.original_pil_image.copy()
+        self.operations = []
+        self.redo_operations = []
+        self.current_pil_image = self.proxy_base
+        self.rendered_operations = []
         self.update_preview()
     
     def cancel_editing(self):
@@ -643,15 +1317,37 @@ class ImageEditor(QMainWindow):
         self.close()
     
     def resizeEvent(self, event):
-        self.update_preview()
+        # Re-render once the user stops dragging instead of on every event
+        self.resize_timer.start()
         super().resizeEvent(event)
+    
+    def on_resize_settled(self):
+        # Rebuild the proxy only when the frame outgrows it
+        bounds = self.preview_bounds()
+        if bounds[0] > self.proxy_bounds[0] or bounds[1] > self.proxy_bounds[1]:
+            self.proxy_stale = True
+        self.update_preview()
+    
+    def closeEvent(self, event):
+        self.resize_timer.stop()
+        self.render_scheduler.cancel()
+        self.render_scheduler.wait()
+        self.history.close()
+        self.original_pil_image.close()
+        try:
+            os.remove(self.original_path)
+        except OSError:
+            pass
+        super().closeEvent(event)
 
 from PyQt5.QtCore import QFileInfo
 
 def main():
     app = QApplication(sys.argv)
     window = MainWindow()
+    app.aboutToQuit.connect(window.db_handler.close)
     window.show()
+    startup.after_first_paint(window.connect_database)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
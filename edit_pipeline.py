@@ -0,0 +1,336 @@
+import io
+import struct
+
+from PIL import Image, ImageEnhance, ImageFilter
+
+import color_filters
+import tiled
+import tracing
+
+# Bounding box of the thumbnails stored in image_thumbnails
+THUMBNAIL_SIZE = (200, 150)
+
+
+def rotate(image, degrees):
+    return image.rotate(degrees, expand=True)
+
+
+def flip(image, direction):
+    if direction == "horizontal":
+        return image.transpose(Image.FLIP_LEFT_RIGHT)
+    return image.transpose(Image.FLIP_TOP_BOTTOM)
+
+
+def brightness(image, factor):
+    return tiled.enhance(image, ImageEnhance.Brightness, factor)
+
+
+def contrast(image, factor):
+    return tiled.enhance(image, ImageEnhance.Contrast, factor)
+
+
+def saturation(image, factor):
+    return tiled.enhance(image, ImageEnhance.Color, factor)
+
+
+def blur(image, radius):
+    # Gaussian blur; radius is a fraction of the image's longer side, so the
+    # preview proxy and the full-resolution replay look the same
+    pixels = radius * max(image.size)
+    if pixels <= 0:
+        return image
+    kernel = ImageFilter.GaussianBlur(pixels)
+    return tiled.map_image(image, lambda strip: strip.filter(kernel), tiled.gaussian_halo(pixels))
+
+
+def grayscale(image):
+    return tiled.map_image(image, color_filters.grayscale)
+
+
+def apply_filter(image, filter_type):
+    if filter_type == "sepia":
+        return tiled.map_image(image, color_filters.sepia)
+    elif filter_type == "blur":
+        return tiled.filter_image(image, ImageFilter.BLUR)
+    elif filter_type == "sharpen":
+        return tiled.filter_image(image, ImageFilter.SHARPEN)
+    return image
+
+
+# Operation name -> function(image, *args). ImageEditor records edits as
+# (name, args) tuples so they can be replayed on any resolution.
+OPERATIONS = {
+    "rotate": rotate,
+    "flip": flip,
+    "brightness": brightness,
+    "contrast": contrast,
+    "saturation": saturation,
+    "blur": blur,
+    "grayscale": grayscale,
+    "filter": apply_filter,
+}
+
+
+def apply_operation(image, operation):
+    name, args = operation
+    return OPERATIONS[name](image, *args)
+
+
+def replay(image, operations):
+    for step in compile_operations(operations):
+        image = apply_step(image, step)
+    return image
+
+
+# Pipeline compiler. Recorded operations are turned into a shorter list of
+# steps before they run:
+#   - rotations by multiples of 90 and flips are folded into one transpose
+#     (or dropped when they cancel out); they only move pixels, so they are
+#     also hoisted past brightness/contrast/color-matrix steps
+#   - runs of brightness/contrast become one lookup table applied in a
+#     single point() pass
+#   - runs of color matrices (grayscale, sepia) are multiplied into one
+# Anything else (blur, sharpen, free rotation) is kept as is and acts as a
+# barrier between fused groups.
+
+# Small image with distinct pixel values, used to work out which single
+# transpose a sequence of rotations and flips amounts to
+TRANSPOSE_PROBE = Image.frombytes("L", (3, 2), bytes(range(6)))
+TRANSPOSE_METHODS = [
+    Image.FLIP_LEFT_RIGHT,
+    Image.FLIP_TOP_BOTTOM,
+    Image.ROTATE_90,
+    Image.ROTATE_180,
+    Image.ROTATE_270,
+    Image.TRANSPOSE,
+    Image.TRANSVERSE,
+]
+
+POINT_MATRICES = {
+    ("grayscale", ()): color_filters.GRAYSCALE,
+    ("filter", ("sepia",)): color_filters.SEPIA,
+}
+
+
+def is_transpose(operation):
+    name, args = operation
+    return name == "flip" or (name == "rotate" and args[0] % 90 == 0)
+
+
+def inverse_operation(operation):
+    # Only transposes can be undone without going back to stored pixels
+    name, args = operation
+    if name == "rotate":
+        return ("rotate", (-args[0],))
+    return operation
+
+
+def transpose_method(probe):
+    if probe.tobytes() == TRANSPOSE_PROBE.tobytes() and probe.size == TRANSPOSE_PROBE.size:
+        return None
+    for method in TRANSPOSE_METHODS:
+        candidate = TRANSPOSE_PROBE.transpose(method)
+        if candidate.size == probe.size and candidate.tobytes() == probe.tobytes():
+            return method
+    raise ValueError("Rotations and flips did not reduce to a single transpose")
+
+
+def matrix_clips(matrix):
+    # A matrix whose rows are non-negative and sum to at most 1 never leaves
+    # 0..255, so nothing is lost by skipping the clip between two matrices
+    for row in range(3):
+        coefficients = matrix[row * 4:row * 4 + 3]
+        if matrix[row * 4 + 3] != 0 or min(coefficients) < 0 or sum(coefficients) > 1.0:
+            return True
+    return False
+
+
+def compile_operations(operations):
+    steps = []
+    probe = TRANSPOSE_PROBE
+    point_steps = []
+
+    def flush():
+        nonlocal probe, point_steps
+        method = transpose_method(probe)
+        if method is not None:
+            steps.append(("transpose", method))
+        steps.extend(point_steps)
+        probe = TRANSPOSE_PROBE
+        point_steps = []
+
+    for operation in operations:
+        name, args = operation
+        if is_transpose(operation):
+            probe = apply_operation(probe, operation)
+        elif name in ("brightness", "contrast"):
+            if args[0] == 1.0:
+                continue
+            if point_steps and point_steps[-1][0] == "tone":
+                point_steps[-1] = ("tone", point_steps[-1][1] + ((name, args[0]),))
+            else:
+                point_steps.append(("tone", ((name, args[0]),)))
+        elif operation in POINT_MATRICES:
+            matrix = POINT_MATRICES[operation]
+            if point_steps and point_steps[-1][0] == "matrix" and not matrix_clips(point_steps[-1][1]):
+                matrix = color_filters.compose_matrices(matrix, point_steps[-1][1])
+                point_steps[-1] = ("matrix", matrix)
+            else:
+                point_steps.append(("matrix", matrix))
+        else:
+            flush()
+            steps.append(("operation", operation))
+    flush()
+    return steps
+
+
+def apply_step(image, step):
+    with tracing.span("transform", step=step[0]):
+        return run_step(image, step)
+
+
+def run_step(image, step):
+    kind, value = step
+    if kind == "transpose":
+        return image.transpose(value)
+    elif kind == "tone":
+        return apply_tone(image, value)
+    elif kind == "matrix":
+        return tiled.map_image(image, lambda strip: color_filters.apply_color_matrix(strip, value))
+    return apply_operation(image, value)
+
+
+def float32(value):
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def blend_value(degenerate, value, factor):
+    # Image.blend's per-pixel arithmetic (single precision, truncated), so
+    # the table matches ImageEnhance output exactly
+    result = float32(degenerate + float32(float32(factor) * (value - degenerate)))
+    if result <= 0:
+        return 0
+    if result >= 255:
+        return 255
+    return int(result)
+
+
+def apply_tone(image, adjustments):
+    bands = image.getbands()
+    color_bands = [band for band in bands if band != "A"]
+    if color_bands not in (["R", "G", "B"], ["L"]):
+        for name, factor in adjustments:
+            image = OPERATIONS[name](image, factor)
+        return image
+
+    # One histogram pass gives every contrast step its mean luminance
+    histogram = image.histogram()
+    luts = [list(range(256)) for _ in bands]
+    pixel_count = image.size[0] * image.size[1]
+
+    for name, factor in adjustments:
+        if name == "contrast":
+            channel_means = [
+                sum(count * lut[value] for value, count in enumerate(histogram[i * 256:(i + 1) * 256])) / pixel_count
+                for i, lut in enumerate(luts)
+            ]
+            if color_bands == ["L"]:
+                mean = channel_means[0]
+            else:
+                # convert("L") weights; per-pixel rounding is averaged out
+                mean = (19595 * channel_means[0] + 38470 * channel_means[1] + 7471 * channel_means[2]) / 65536
+            degenerate = int(mean + 0.5)
+        else:
+            degenerate = 0
+        for i, band in enumerate(bands):
+            if band != "A":
+                luts[i] = [blend_value(degenerate, value, factor) for value in luts[i]]
+
+    return image.point([value for lut in luts for value in lut])
+
+
+class LivePreview:
+    # Slider feedback while dragging: only the bitmap on screen is redrawn,
+    # from a display-sized copy of the current preview. Brightness and
+    # contrast are one lookup table (see apply_tone), saturation a blend with
+    # a grey copy made once per drag, blur a Gaussian of the small image.
+    # The exact operation is recorded when the slider is released.
+    def __init__(self, image):
+        self.image = image
+        self.saturation = None
+
+    def render(self, name, value):
+        if name in ("brightness", "contrast"):
+            return apply_tone(self.image, ((name, value),))
+        elif name == "saturation":
+            if self.saturation is None:
+                self.saturation = ImageEnhance.Color(self.image)
+            return self.saturation.enhance(value)
+        return apply_operation(self.image, (name, (value,)))
+
+
+def eight_bit(image):
+    # reduce() rejects palette, bilevel and 16-bit images, and resize()
+    # falls back to nearest neighbour for palette ones, so proxies,
+    # thumbnails and full-resolution renders all work on an 8-bit copy
+    if image.mode == "P":
+        return image.convert("RGBA" if image.has_transparency_data else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode.startswith("I"):
+        # 16-bit samples scaled to 8 bits rather than clipped at 255
+        return image.convert("I").point(lambda value: value / 256).convert("L")
+    return image
+
+
+def make_proxy(image, max_size):
+    # Downscaled working copy; reduce() first so large JPEG/PNG scans are
+    # shrunk by an integer factor in C before the final resample
+    image = eight_bit(image)
+    width, height = image.size
+    scale = min(max_size[0] / width, max_size[1] / height)
+    if scale >= 1:
+        return image.copy()
+    factor = int(1 / scale)
+    if factor >= 2:
+        image = image.reduce(factor)
+    proxy_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(proxy_size, Image.LANCZOS)
+
+
+def render_full_resolution(image, operations):
+    # Same working mode as make_proxy, so a save matches the preview
+    return replay(eight_bit(image), operations)
+
+
+def load_preview(source, max_size):
+    # Decode a file (path or file object) at roughly preview size. JPEG
+    # scales by 1/2, 1/4 or 1/8 inside the decoder via draft(), so a 40 MP
+    # photo never exists at full size in memory; other formats are decoded
+    # and then shrunk with make_proxy's reduce() + resize.
+    with tracing.span("decode"):
+        image = Image.open(source)
+        image.draft(image.mode, max_size)
+        return make_proxy(image, max_size)
+
+
+def make_thumbnail(image, size):
+    # Small JPEG (or PNG when there is transparency) for list views
+    thumbnail = make_proxy(image, size)
+    img_bytes = io.BytesIO()
+    with tracing.span("encode"):
+        if "A" in thumbnail.getbands() or "transparency" in thumbnail.info:
+            thumbnail.save(img_bytes, format="PNG")
+        else:
+            thumbnail.convert("RGB").save(img_bytes, format="JPEG", quality=85)
+    return img_bytes.getvalue()
+
+
+def make_thumbnail_from_data(image_data, size):
+    return make_thumbnail(load_preview(io.BytesIO(image_data), size), size)
+
+
+def pil_format(image_type):
+    # Pillow knows JPEG files as "JPEG", never "JPG"
+    image_type = image_type.upper()
+    return "JPEG" if image_type == "JPG" else image_type
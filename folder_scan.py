@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# A batch goes to the UI once it has this many names, or once this many
+# seconds have passed since the previous one
+BATCH_SIZE = 500
+BATCH_INTERVAL = 0.1
+
+
+def has_extension(name, extensions):
+    # extensions are lower case with the dot, e.g. {".jpg", ".png"}
+    return os.path.splitext(name)[1].lower() in extensions
+
+
+def iter_images(directory, extensions, recursive=False, skip_dirs=(), cancelled=None):
+    # Yields paths relative to directory as os.scandir reports them, without
+    # listing a whole folder first
+    pending = [""]
+    while pending:
+        relative = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(directory, relative))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if cancelled is not None and cancelled.is_set():
+                    return
+                try:
+                    if entry.is_file():
+                        if has_extension(entry.name, extensions):
+                            yield os.path.join(relative, entry.name)
+                    elif recursive and entry.is_dir(follow_symlinks=False) and entry.name not in skip_dirs:
+                        pending.append(os.path.join(relative, entry.name))
+                except OSError:
+                    continue
+
+
+class FolderScanner(QObject):
+    # Scans a folder on a background thread and hands the matching names to
+    # the UI thread in batches. Starting a new scan cancels the previous one;
+    # batches from a cancelled scan are dropped.
+    found = pyqtSignal(list)
+    finished = pyqtSignal(bool)
+
+    batch_ready = pyqtSignal(int, list)
+    scan_done = pyqtSignal(int, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.cancel_event = None
+        self.batch_ready.connect(self.deliver_batch)
+        self.scan_done.connect(self.deliver_done)
+
+    def scan(self, directory, extensions, recursive=False, skip_dirs=()):
+        self.cancel()
+        self.generation += 1
+        self.cancel_event = threading.Event()
+        thread = threading.Thread(
+            target=self.run,
+            args=(self.generation, self.cancel_event, directory, extensions, recursive, skip_dirs),
+            name="folder-scan",
+            daemon=True
+        )
+        thread.start()
+
+    def cancel(self):
+        # The thread may be stuck in a slow scandir call; it is not waited
+        # for, it just stops reporting
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_event = None
+            self.finished.emit(True)
+
+    def is_scanning(self):
+        return self.cancel_event is not None
+
+    def run(self, generation, cancelled, directory, extensions, recursive, skip_dirs):
+        batch = []
+        last_batch = time.monotonic()
+        for path in iter_images(directory, extensions, recursive, skip_dirs, cancelled):
+            batch.append(path)
+            if len(batch) >= BATCH_SIZE or time.monotonic() - last_batch >= BATCH_INTERVAL:
+                self.batch_ready.emit(generation, batch)
+                batch = []
+                last_batch = time.monotonic()
+        if batch and not cancelled.is_set():
+            self.batch_ready.emit(generation, batch)
+        self.scan_done.emit(generation, cancelled.is_set())
+
+    def deliver_batch(self, generation, batch):
+        if generation == self.generation and self.cancel_event is not None:
+            self.found.emit(batch)
+
+    def deliver_done(self, generation, cancelled):
+        if generation == self.generation and self.cancel_event is not None:
+            self.cancel_event = None
+            self.finished.emit(cancelled)
@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+import edit_pipeline
+
+# Edge length of the tiles snapshots are cut into
+TILE_SIZE = 256
+
+
+class Snapshot:
+    # Pixels of one history state: tiles in memory, or one raw file on disk
+    # once spilled. Tiles equal to the parent snapshot's are the same bytes
+    # object, so unchanged regions are only held once.
+    def __init__(self, image, parent=None):
+        self.mode = image.mode
+        self.size = image.size
+        self.palette = image.getpalette() if image.mode == "P" else None
+        self.path = None
+        self.tiles = {}
+        if parent is not None and (parent.mode, parent.size) != (self.mode, self.size):
+            parent = None
+
+        width, height = self.size
+        for top in range(0, height, TILE_SIZE):
+            for left in range(0, width, TILE_SIZE):
+                box = (left, top, min(left + TILE_SIZE, width), min(top + TILE_SIZE, height))
+                data = image.crop(box).tobytes()
+                shared = parent.tiles.get(box) if parent is not None else None
+                self.tiles[box] = shared if shared == data else data
+
+    def to_image(self):
+        if self.path is not None:
+            with open(self.path, "rb") as spill_file:
+                image = Image.frombytes(self.mode, self.size, spill_file.read())
+        else:
+            image = Image.new(self.mode, self.size)
+            for box, data in self.tiles.items():
+                tile_size = (box[2] - box[0], box[3] - box[1])
+                image.paste(Image.frombytes(self.mode, tile_size, data), box[:2])
+        if self.palette is not None:
+            image.putpalette(self.palette)
+        return image
+
+    def spill(self, path):
+        data = self.to_image().tobytes()
+        with open(path, "wb") as spill_file:
+            spill_file.write(data)
+        self.path = path
+        self.tiles = {}
+
+
+class EditHistory:
+    # Rendered states of the edit list, keyed by the operation prefix that
+    # produced them, so undo and redo only move through the operation list
+    # and fetch pixels from here. In-memory tiles are kept under
+    # memory_budget bytes; least recently used states are written to a
+    # temporary directory (or dropped when spill is off) beyond that.
+    #
+    # Rotations by multiples of 90 and flips are never stored as pixels:
+    # those states are rebuilt by applying the transpose to the nearest
+    # stored state, or by applying the inverse to the current image.
+    def __init__(self, memory_budget, spill=True):
+        self.memory_budget = memory_budget
+        self.spill_enabled = spill
+        self.spill_dir = None
+        self.spill_count = 0
+        self.lock = threading.Lock()
+        self.snapshots = OrderedDict()
+        self.tile_refs = {}
+        self.memory_used = 0
+
+    def reset(self, base):
+        # Start over from a new base image (e.g. a rebuilt proxy)
+        with self.lock:
+            for key in list(self.snapshots):
+                self.remove(key)
+            self.store((), base)
+
+    def record(self, operations, image):
+        key = tuple(operations)
+        with self.lock:
+            if key in self.snapshots:
+                self.snapshots.move_to_end(key)
+                return
+            start, _ = self.nearest(key)
+            if start is not None and all(edit_pipeline.is_transpose(op) for op in key[len(start):]):
+                # Reachable from a stored state by transposes alone
+                return
+            self.store(key, image)
+            self.enforce_budget()
+
+    def restore(self, operations, current=None, current_operations=None, base=None):
+        # Returns (image, count): the state after the first count operations,
+        # count as close to len(operations) as the stored states allow. With
+        # nothing stored (never reset, or closed meanwhile) that is (base, 0),
+        # base being the image the operations start from.
+        key = tuple(operations)
+        if current is not None and current_operations is not None:
+            extra = tuple(current_operations)[len(key):]
+            if tuple(current_operations[:len(key)]) == key and all(edit_pipeline.is_transpose(op) for op in extra):
+                inverse = [edit_pipeline.inverse_operation(op) for op in reversed(extra)]
+                return edit_pipeline.replay(current, inverse), len(key)
+        with self.lock:
+            start, snapshot = self.nearest(key)
+            if snapshot is None:
+                return base, 0
+            self.snapshots.move_to_end(start)
+            return snapshot.to_image(), len(start)
+
+    def discard_after(self, operations):
+        # Drop states on branches that no longer match the operation list
+        key = tuple(operations)
+        with self.lock:
+            for stored in list(self.snapshots):
+                if stored and stored[:len(key)] != key and key[:len(stored)] != stored:
+                    self.remove(stored)
+
+    def nearest(self, key):
+        for length in range(len(key), -1, -1):
+            snapshot = self.snapshots.get(key[:length])
+            if snapshot is not None:
+                return key[:length], snapshot
+        return None, None
+
+    def store(self, key, image):
+        _, parent = self.nearest(key)
+        if parent is not None and parent.path is not None:
+            parent = None
+        snapshot = Snapshot(image, parent)
+        for data in snapshot.tiles.values():
+            ref = self.tile_refs.get(id(data))
+            if ref is None:
+                self.tile_refs[id(data)] = [data, 1]
+                self.memory_used += len(data)
+            else:
+                ref[1] += 1
+        self.snapshots[key] = snapshot
+
+    def release_tiles(self, snapshot):
+        for data in snapshot.tiles.values():
+            ref = self.tile_refs[id(data)]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self.tile_refs[id(data)]
+                self.memory_used -= len(data)
+
+    def remove(self, key):
+        snapshot = self.snapshots.pop(key)
+        self.release_tiles(snapshot)
+        if snapshot.path is not None:
+            os.remove(snapshot.path)
+
+    def enforce_budget(self):
+        # Oldest first; the base state and the newest state stay in memory
+        newest = next(reversed(self.snapshots))
+        for key in list(self.snapshots):
+            if self.memory_used <= self.memory_budget:
+                break
+            snapshot = self.snapshots[key]
+            if key == () or key == newest or snapshot.path is not None:
+                continue
+            if self.spill_enabled:
+                if self.spill_dir is None:
+                    self.spill_dir = tempfile.mkdtemp(prefix="photo-editor-history-")
+                self.spill_count += 1
+                self.release_tiles(snapshot)
+                snapshot.spill(os.path.join(self.spill_dir, f"{self.spill_count}.raw"))
+            else:
+                self.remove(key)
+
+    def close(self):
+        with self.lock:
+            for key in list(self.snapshots):
+                self.remove(key)
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+
+def image_bytes(image):
+    # Decoded size; also right for images that are still lazily opened
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+class ImageCache:
+    # LRU of decoded PIL images bounded by their pixel bytes rather than by
+    # count, so a few 40 MP originals and hundreds of previews share one
+    # budget. Safe to use from the UI thread and the prefetcher.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def __contains__(self, key):
+        # Doesn't count as a hit or miss, or refresh the entry
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, image):
+        size = image_bytes(image)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (image, size)
+            self.used_bytes += size
+            while self.used_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.used_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.used_bytes,
+            }
+
+
+class Prefetcher:
+    # Fills an ImageCache on a background thread. schedule() replaces the
+    # whole to-do list, so moving on quickly drops work for files that are
+    # no longer nearby.
+    def __init__(self, cache):
+        self.cache = cache
+        self.tasks = []
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="image-prefetch", daemon=True)
+        self.thread.start()
+
+    def schedule(self, tasks):
+        # tasks: [(cache key, function returning the image)], most wanted first
+        with self.condition:
+            self.tasks = list(tasks)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.tasks and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                key, load = self.tasks.pop(0)
+            if key in self.cache:
+                continue
+            try:
+                image = load()
+            except Exception as err:
+                # The UI reports the error if the file is actually opened
+                print(f"Prefetch of {key} failed: {err}")
+                continue
+            self.cache.put(key, image)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
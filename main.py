@@ -1,10 +1,18 @@
 import os
-import mysql.connector
 from datetime import datetime
-from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QListWidget, QComboBox, QVBoxLayout, QHBoxLayout, QFileDialog, QInputDialog, QMessageBox
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QListWidget, QComboBox, QVBoxLayout, QHBoxLayout, QFileDialog, QInputDialog, QMessageBox, QCheckBox
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPixmap
-from PIL import Image, ImageFilter, ImageEnhance
+from qt_image import pil_to_qpixmap
+from save_queue import SaveQueue
+from folder_scan import FolderScanner
+from image_cache import ImageCache, Prefetcher
+import startup
+import tracing
+from trace_panel import TraceStatus
+
+# The MySQL driver, asyncio and Pillow (through edit_pipeline and
+# transformations) are imported where they are used, so the window paints
+# without waiting for them; startup.StartupTask loads them in the background
 
 # Database configuration - hardcoded credentials
 DB_CONFIG = {
@@ -14,58 +22,39 @@ DB_CONFIG = {
     'database': 'photo_editor'
 }
 
-# Initialize database connection
-def init_db():
+# Connections handed out per operation; safe to share with worker threads
+DB_POOL_SIZE = 5
+
+# Edit log rows are committed in groups of up to this many, or this many
+# seconds after the first buffered row
+EDIT_LOG_BATCH_SIZE = 200
+EDIT_LOG_MAX_DELAY = 0.5
+
+# File types listed when a folder is opened, matched case-insensitively
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Decoded previews and originals kept for file_list navigation, and how many
+# files either side of the current one are decoded ahead of time. The budget
+# should hold the 2 * PREFETCH_RADIUS + 1 originals around the current row.
+IMAGE_CACHE_BYTES = 768 * 1024 * 1024
+PREFETCH_RADIUS = 2
+
+# Runs on the startup thread, after the window is up
+def open_database():
+    startup.preload()
+    import catalog
+    from db_pool import ConnectionPool
+    # Creates the database first if the server does not have it yet
+    pool = ConnectionPool(DB_CONFIG, pool_size=DB_POOL_SIZE)
     try:
-        # First try to connect to the specified database
-        conn = mysql.connector.connect(**DB_CONFIG)
-        
-    except mysql.connector.Error as err:
-        if err.errno == mysql.connector.errorcode.ER_BAD_DB_ERROR:
-            # Database doesn't exist, try to create it
-            config = DB_CONFIG.copy()
-            config.pop('database')
-            try:
-                conn = mysql.connector.connect(**config)
-                cursor = conn.cursor()
-                cursor.execute(f"CREATE DATABASE {DB_CONFIG['database']}")
-                conn.database = DB_CONFIG['database']
-                
-            except mysql.connector.Error as err:
-                QMessageBox.critical(None, "Database Error", f"Failed to create database: {err}")
-                return None
-                
-        else:
-            QMessageBox.critical(None, "Database Error", f"Connection failed: {err}")
-            return None
-    
-    # Create tables
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS images (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        filename VARCHAR(255) NOT NULL,
-        filepath VARCHAR(255) NOT NULL,
-        original_path VARCHAR(255) NOT NULL,
-        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        description TEXT
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS edits (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        image_id INT,
-        filter_name VARCHAR(50) NOT NULL,
-        edit_path VARCHAR(255) NOT NULL,
-        date_edited TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
-    )
-    ''')
-    
-    conn.commit()
-    return conn
+        with pool.cursor() as cursor:
+            catalog.ensure_schema(cursor)
+    except Exception:
+        pool.close()
+        raise
+    # Warm the editing modules while the user picks a folder
+    startup.preload(["edit_pipeline", "transformations"])
+    return pool
 
 app = QApplication([])
 main_window = QWidget()
@@ -74,7 +63,12 @@ main_window.resize(800, 600)
 
 # UI Elements
 btn_folder = QPushButton("Select New photo")
+chk_subfolders = QCheckBox("Include subfolders")
+btn_cancel_scan = QPushButton("Cancel Scan")
+btn_cancel_scan.setEnabled(False)
 file_list = QListWidget()
+file_list.setUniformItemSizes(True)
+cache_status = QLabel()
 
 btn_left = QPushButton("Left")
 btn_right = QPushButton("Right")
@@ -90,6 +84,7 @@ btn_add_description = QPushButton("Add Description")
 btn_view_history = QPushButton("View Edit History")
 btn_delete_image = QPushButton("Delete Image")
 btn_reconnect_db = QPushButton("Reconnect to Database")
+db_status = QLabel()
 
 filter_box = QComboBox()
 filter_box.addItems(["Original", "Left", "Right", "Mirror", "Sharpness", "B/W", "Saturation", "Contrast", "Blur"])
@@ -101,7 +96,10 @@ col1 = QVBoxLayout()
 col2 = QVBoxLayout()
 
 col1.addWidget(btn_folder)
+col1.addWidget(chk_subfolders)
+col1.addWidget(btn_cancel_scan)
 col1.addWidget(file_list)
+col1.addWidget(cache_status)
 col1.addWidget(filter_box)
 col1.addWidget(btn_left)
 col1.addWidget(btn_right)
@@ -118,145 +116,278 @@ col1.addWidget(btn_add_description)
 col1.addWidget(btn_view_history)
 col1.addWidget(btn_delete_image)
 col1.addWidget(btn_reconnect_db)
+col1.addWidget(db_status)
 
 col2.addWidget(picture_box)
 
+# Per-stage timings, with PHOTO_TRACE set (see tracing.py)
+if tracing.enabled:
+    col2.addWidget(TraceStatus())
+
 master_layout.addLayout(col1, 20)
 master_layout.addLayout(col2, 80)
 main_window.setLayout(master_layout)
 
 working_directory = ""
-conn = init_db()
 
-def filter_files(files, extensions):
-    return [file for file in files if any(file.endswith(ext) for ext in extensions)]
+# Set by database_ready once the startup thread has connected; all None
+# while connecting and after a failed attempt
+db_pool = None
+db_aio = None
+edit_log = None
+db_connect = startup.StartupTask()
+
+# Catalog lookups and edit logging run as coroutines on a background loop so
+# slow queries never stall the Qt event loop; created with the first
+# connection
+db_runner = None
+
+# images.id by (filepath, filename), filled when a folder is opened so
+# clicking a file needs no database round trip
+image_ids = {}
+
+# Edited images are encoded and written off the UI thread; repeated edits of
+# the same file collapse into one write of the latest result
+save_queue = SaveQueue()
+
+image_cache = ImageCache(IMAGE_CACHE_BYTES)
+prefetcher = Prefetcher(image_cache)
+
+# Lists folders on a worker thread; names arrive in batches while it runs
+folder_scanner = FolderScanner()
 
 def getWorkDirectory():
     global working_directory
+    folder_scanner.cancel()
     file_list.clear()
     working_directory = QFileDialog.getExistingDirectory(main_window, "Select Directory")
     if working_directory:
-        files = os.listdir(working_directory)
-        filtered_files = filter_files(files, ['.jpg', '.png', '.jpeg'])
-        file_list.addItems(filtered_files)
+        btn_cancel_scan.setEnabled(True)
+        # Earlier results live in the edits folder; don't list them as sources
+        folder_scanner.scan(working_directory, IMAGE_EXTENSIONS, recursive=chk_subfolders.isChecked(),
+                            skip_dirs={os.path.normpath(main.save_folder)})
 
-def reconnect_database():
-    global conn
-    if conn:
-        conn.close()
-    conn = init_db()
-    if conn:
+def add_scanned_files(filenames):
+    file_list.addItems(filenames)
+    
+    # Register each batch with one bulk upsert
+    if db_aio:
+        import db_async
+        directory = working_directory
+        db_runner.submit(
+            db_async.register_images(db_aio, directory, filenames),
+            on_done=lambda ids: cache_image_ids(directory, ids)
+        )
+
+def scan_finished(cancelled):
+    btn_cancel_scan.setEnabled(False)
+
+def cache_image_ids(directory, ids):
+    for filename, image_id in ids.items():
+        image_ids[(directory, filename)] = image_id
+
+def connect_database(reconnect=False):
+    db_status.setText("Database: connecting...")
+    btn_reconnect_db.setEnabled(False)
+    db_connect.start(open_database,
+                     on_done=lambda pool: database_ready(pool, reconnect),
+                     on_error=lambda err: database_failed(err, reconnect))
+
+def database_ready(pool, reconnect):
+    global db_pool, db_aio, edit_log, db_runner
+    from async_bridge import AsyncRunner
+    from db_async import AsyncConnectionPool, EditLogWriter
+    if db_runner is None:
+        db_runner = AsyncRunner()
+    db_pool = pool
+    db_aio = AsyncConnectionPool(DB_CONFIG, DB_POOL_SIZE)
+    edit_log = EditLogWriter(db_aio, EDIT_LOG_BATCH_SIZE, EDIT_LOG_MAX_DELAY)
+    db_status.setText("Database: connected")
+    btn_reconnect_db.setEnabled(True)
+    if reconnect:
         QMessageBox.information(main_window, "Success", "Database connection established")
+
+def database_failed(err, reconnect):
+    db_status.setText("Database: not connected")
+    btn_reconnect_db.setEnabled(True)
+    if reconnect:
+        QMessageBox.warning(main_window, "Warning", f"Failed to connect to database: {err}")
+    else:
+        QMessageBox.critical(main_window, "Database Error", f"Connection failed: {err}")
+
+def close_edit_log():
+    # Writes buffered rows; when the server cannot take them they are lost,
+    # which is reported rather than raised on the way out
+    import mysql.connector
+    try:
+        db_runner.run(edit_log.close())
+    except mysql.connector.Error as err:
+        print(f"Dropped {len(edit_log.pending)} unsaved edit log rows: {err}")
+
+def reconnect_database():
+    global db_pool, db_aio, edit_log
+    if edit_log:
+        close_edit_log()
+    if db_pool:
+        db_pool.close()
+    if db_aio:
+        db_runner.run(db_aio.close())
+    db_pool = db_aio = edit_log = None
+    image_ids.clear()
+    connect_database(reconnect=True)
+
+def database_missing():
+    # Tells the user and returns True when there is no connection to use
+    if db_pool:
+        return False
+    if db_connect.running:
+        QMessageBox.warning(main_window, "Warning", "Still connecting to the database")
     else:
-        QMessageBox.warning(main_window, "Warning", "Failed to connect to database")
+        QMessageBox.warning(main_window, "Warning", "No database connection")
+    return True
+
+async def wait_quietly(future):
+    # Wait for an earlier background task; its own failure was already reported
+    import asyncio
+    if future is not None:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            pass
 
 class Editor():
     def __init__(self):
         self.image = None
         self.original = None
+        # False while original is only opened, not decoded
+        self.decoded = False
         self.filename = None
+        self.fullname = None
         self.save_folder = "edits/"
         self.current_image_id = None
+        # Future resolving to the images.id of the current file
+        self.image_id_future = None
+        # Edit logs are chained so they land in order; history waits on the last
+        self.last_log_future = None
         
     def load_image(self, filename):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        from concurrent.futures import Future
+        from PIL import Image
+        import db_async
+        if database_missing():
             return
             
         self.filename = filename
         fullname = os.path.join(working_directory, filename)
-        self.image = Image.open(fullname)
-        self.original = self.image.copy()
+        self.fullname = fullname
+        # Otherwise left undecoded until the first edit needs the pixels;
+        # transforms return new images, so original can share the object
+        self.image = image_cache.get(original_key(fullname))
+        self.decoded = self.image is not None
+        if self.image is None:
+            self.image = Image.open(fullname)
+        self.original = self.image
         
-        # Check if image exists in database, if not, add it
-        cursor = conn.cursor(buffered=True)
-        cursor.execute("SELECT id FROM images WHERE filename = %s AND filepath = %s", 
-                      (filename, working_directory))
-        result = cursor.fetchone()
+        cached_id = image_ids.get((working_directory, filename))
+        if cached_id is not None:
+            self.current_image_id = cached_id
+            self.image_id_future = Future()
+            self.image_id_future.set_result(cached_id)
+            return
         
-        if result:
-            self.current_image_id = result[0]
-        else:
-            # Create new image record
-            cursor.execute(
-                "INSERT INTO images (filename, filepath, original_path) VALUES (%s, %s, %s)",
-                (filename, working_directory, fullname)
-            )
-            conn.commit()
-            self.current_image_id = cursor.lastrowid
+        # Not registered yet (the folder upsert may still be running)
+        self.current_image_id = None
+        directory = working_directory
+        self.image_id_future = db_runner.submit(
+            db_async.register_image(db_aio, filename, directory, fullname),
+            on_done=lambda image_id: self.set_image_id(directory, filename, image_id)
+        )
+    
+    def set_image_id(self, directory, filename, image_id):
+        image_ids[(directory, filename)] = image_id
+        # Ignore lookups that finish after the user moved to another file
+        if filename == self.filename:
+            self.current_image_id = image_id
+    
+    def log_edit(self, filter_name, saved_path):
+        id_future = self.image_id_future
+        if id_future is None:
+            return
+        
+        previous_log = self.last_log_future
+        
+        async def log():
+            import asyncio
+            await wait_quietly(previous_log)
+            image_id = await asyncio.wrap_future(id_future)
+            edit_log.add(image_id, filter_name, saved_path)
+        
+        self.last_log_future = db_runner.submit(log())
             
     def save_image(self):
-        path = os.path.join(working_directory, self.save_folder)
-        os.makedirs(path, exist_ok=True)
-        fullname = os.path.join(path, self.filename)
-        self.image.save(fullname)
+        fullname = os.path.join(working_directory, self.save_folder, self.filename)
+        # filename may include subfolders when the scan was recursive
+        os.makedirs(os.path.dirname(fullname), exist_ok=True)
+        save_queue.submit(fullname, self.image)
         return fullname
+    
+    def record_edit(self, filter_name):
+        # The one write path for an edit: queue the file, log the row
+        saved_path = self.save_image()
+        self.log_edit(filter_name, saved_path)
 
-    def show_image(self, path):
+    def show_preview(self):
+        # Straight from the file at label size (JPEG decodes at 1/2-1/8 scale)
+        size = preview_size()
+        key = preview_key(self.fullname, size)
+        preview = image_cache.get(key)
+        if preview is None:
+            import edit_pipeline
+            preview = edit_pipeline.load_preview(self.fullname, size)
+            image_cache.put(key, preview)
+        self.show_image(preview)
+    
+    def show_image(self, pil_image):
+        import edit_pipeline
         picture_box.hide()
-        image = QPixmap(path)
         w, h = picture_box.width(), picture_box.height()
-        image = image.scaled(w, h, Qt.KeepAspectRatio)
+        with tracing.span("pixmap.scale"):
+            # Shrink before converting so a full-size edit never becomes a pixmap
+            image = pil_to_qpixmap(edit_pipeline.make_proxy(pil_image, (max(1, w), max(1, h))))
+            image = image.scaled(w, h, Qt.KeepAspectRatio)
         picture_box.setPixmap(image)
         picture_box.show()
 
     def transformImage(self, transformation):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        if database_missing():
             return
             
-        transformations = {
-            "Original": lambda img: self.original.copy(),
-            "Left": lambda img: img.rotate(270),
-            "Right": lambda img: img.rotate(90),
-            "Mirror": lambda img: img.transpose(Image.FLIP_LEFT_RIGHT),
-            "Sharpness": lambda img: ImageEnhance.Sharpness(img).enhance(2.0),
-            "B/W": lambda img: img.convert("L"),
-            "Saturation": lambda img: ImageEnhance.Color(img).enhance(2.0),
-            "Contrast": lambda img: ImageEnhance.Contrast(img).enhance(2.0),
-            "Blur": lambda img: img.filter(ImageFilter.BLUR),
-        }
+        from transformations import TRANSFORMATIONS
+        transformations = dict(TRANSFORMATIONS, Original=lambda img: self.original.copy())
         if transformation in transformations:
-            self.image = transformations[transformation](self.image)
-            saved_path = self.save_image()
-            
-            # Log edit in database
-            if self.current_image_id:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO edits (image_id, filter_name, edit_path) VALUES (%s, %s, %s)",
-                    (self.current_image_id, transformation, saved_path)
-                )
-                conn.commit()
-                
-        self.show_image(os.path.join(working_directory, self.save_folder, self.filename))
+            if not self.decoded:
+                with tracing.span("decode"):
+                    self.original.load()
+                self.decoded = True
+            with tracing.span("transform", op=transformation):
+                self.image = transformations[transformation](self.image)
+            # The original is decoded now; keep it for coming back to this file
+            image_cache.put(original_key(self.fullname), self.original)
+            self.record_edit(transformation)
+        
+        # Shown straight from memory; the file may still be in the queue
+        self.show_image(self.image)
 
     def apply_filter(self, filter_name):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        if database_missing():
             return
             
-        if filter_name == "Original":
-            self.image = self.original.copy()
-        else:
-            self.transformImage(filter_name)
-        saved_path = self.save_image()
-        
-        # Log edit in database
-        if self.current_image_id:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO edits (image_id, filter_name, edit_path) VALUES (%s, %s, %s)",
-                (self.current_image_id, filter_name, saved_path)
-            )
-            conn.commit()
-            
-        self.show_image(os.path.join(working_directory, self.save_folder, self.filename))
+        # transformImage saves, logs and shows the result itself
+        self.transformImage(filter_name)
         
     # CRUD Methods
     def add_description(self):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        if database_missing():
             return
             
         if not self.current_image_id:
@@ -270,36 +401,35 @@ class Editor():
         )
         
         if ok and description:
-            cursor = conn.cursor()
-            cursor.execute(
+            db_pool.execute(
                 "UPDATE images SET description = %s WHERE id = %s",
                 (description, self.current_image_id)
             )
-            conn.commit()
             QMessageBox.information(main_window, "Success", "Description added successfully")
     
     def get_edit_history(self):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        if database_missing():
             return
             
-        if not self.current_image_id:
+        if self.image_id_future is None:
             QMessageBox.warning(main_window, "Warning", "No image selected")
             return
-            
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT filter_name, date_edited 
-            FROM edits 
-            WHERE image_id = %s 
-            ORDER BY date_edited DESC
-            """, 
-            (self.current_image_id,)
-        )
         
-        history = cursor.fetchall()
+        id_future = self.image_id_future
+        last_log = self.last_log_future
+        
+        async def fetch():
+            import asyncio
+            # Let edits logged so far reach the writer so the history
+            # includes them, committed or still buffered
+            await wait_quietly(last_log)
+            image_id = await asyncio.wrap_future(id_future)
+            return await edit_log.fetch_history(image_id)
         
+        db_runner.submit(fetch(), on_done=self.show_edit_history,
+                         on_error=lambda err: QMessageBox.warning(main_window, "Warning", f"Could not load edit history: {err}"))
+    
+    def show_edit_history(self, history):
         if not history:
             QMessageBox.information(main_window, "Edit History", "No edits found for this image")
             return
@@ -311,8 +441,7 @@ class Editor():
         QMessageBox.information(main_window, "Edit History", history_text)
     
     def delete_image_record(self):
-        if not conn:
-            QMessageBox.warning(main_window, "Warning", "No database connection")
+        if database_missing():
             return
             
         if not self.current_image_id:
@@ -328,13 +457,13 @@ class Editor():
         )
         
         if reply == QMessageBox.Yes:
-            cursor = conn.cursor()
             # With ON DELETE CASCADE, we only need to delete the image record
-            cursor.execute("DELETE FROM images WHERE id = %s", (self.current_image_id,))
-            conn.commit()
+            db_pool.execute("DELETE FROM images WHERE id = %s", (self.current_image_id,))
+            image_ids.pop((working_directory, self.filename), None)
             
             QMessageBox.information(main_window, "Success", "Image record deleted successfully")
             self.current_image_id = None
+            self.image_id_future = None
             file_list.clearSelection()
 
 def handle_filter():
@@ -346,10 +475,49 @@ def displayImage():
     if file_list.currentRow() >= 0:
         filename = file_list.currentItem().text()
         main.load_image(filename)
-        main.show_image(os.path.join(working_directory, main.filename))
+        if main.image is not None:
+            main.show_preview()
+            prefetch_around(file_list.currentRow())
+        stats = image_cache.stats()
+        cache_status.setText(f"Cache: {stats['hits']} hits, {stats['misses']} misses, "
+                             f"{stats['bytes'] // (1024 * 1024)} MB")
+
+def preview_size():
+    return (max(1, picture_box.width()), max(1, picture_box.height()))
+
+def preview_key(fullname, size):
+    return ("preview", fullname, size)
+
+def original_key(fullname):
+    return ("original", fullname)
+
+def load_original(fullname):
+    from PIL import Image
+    with tracing.span("decode"):
+        image = Image.open(fullname)
+        image.load()
+    return image
+
+def prefetch_around(row):
+    # Current original first, then neighbour previews, then their originals,
+    # nearest first
+    import edit_pipeline
+    size = preview_size()
+    rows = []
+    for distance in range(1, PREFETCH_RADIUS + 1):
+        rows.extend(r for r in (row + distance, row - distance) if 0 <= r < file_list.count())
+    paths = [os.path.join(working_directory, file_list.item(r).text()) for r in rows]
+    current = os.path.join(working_directory, file_list.item(row).text())
+    tasks = [(original_key(current), lambda path=current: load_original(path))]
+    tasks += [(preview_key(path, size), lambda path=path: edit_pipeline.load_preview(path, size)) for path in paths]
+    tasks += [(original_key(path), lambda path=path: load_original(path)) for path in paths]
+    prefetcher.schedule(tasks)
 
 main = Editor()
 btn_folder.clicked.connect(getWorkDirectory)
+btn_cancel_scan.clicked.connect(folder_scanner.cancel)
+folder_scanner.found.connect(add_scanned_files)
+folder_scanner.finished.connect(scan_finished)
 file_list.currentRowChanged.connect(displayImage)
 filter_box.currentTextChanged.connect(handle_filter)
 
@@ -370,8 +538,20 @@ btn_delete_image.clicked.connect(main.delete_image_record)
 btn_reconnect_db.clicked.connect(reconnect_database)
 
 main_window.show()
+startup.after_first_paint(connect_database)
 app.exec_()
 
-# Close database connection when app closes
-if conn:
-    conn.close()
+# Finish writing queued edits before the process exits
+folder_scanner.cancel()
+prefetcher.close()
+save_queue.close()
+
+# Write buffered edit log rows, then close pooled database connections
+if edit_log:
+    close_edit_log()
+if db_aio:
+    db_runner.run(db_aio.close())
+if db_runner:
+    db_runner.stop()
+if db_pool:
+    db_pool.close()
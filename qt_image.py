@@ -0,0 +1,27 @@
+from PyQt5.QtGui import QImage, QPixmap
+
+# PIL mode -> (raw mode, bytes per pixel, QImage format)
+QIMAGE_FORMATS = {
+    "RGB": ("RGB", 3, QImage.Format_RGB888),
+    "RGBA": ("RGBA", 4, QImage.Format_RGBA8888),
+    "L": ("L", 1, QImage.Format_Grayscale8),
+}
+
+
+def pil_to_qimage(image):
+    # Hand the raw pixel buffer straight to QImage, no PNG/JPEG round trip
+    if image.mode not in QIMAGE_FORMATS:
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    raw_mode, bytes_per_pixel, qformat = QIMAGE_FORMATS[image.mode]
+
+    width, height = image.size
+    data = image.tobytes("raw", raw_mode)
+    qimage = QImage(data, width, height, width * bytes_per_pixel, qformat)
+    # QImage only borrows the buffer, so keep it alive as long as the image
+    qimage._buffer = data
+    return qimage
+
+
+def pil_to_qpixmap(image):
+    return QPixmap.fromImage(pil_to_qimage(image))
@@ -0,0 +1,78 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderTask(QRunnable):
+    def __init__(self, job, generation, scheduler):
+        super().__init__()
+        self.job = job
+        self.generation = generation
+        self.scheduler = scheduler
+
+    def is_cancelled(self):
+        return self.generation != self.scheduler.generation
+
+    def run(self):
+        # Nothing may escape: an exception leaving a QRunnable override
+        # aborts the process
+        error = None
+        try:
+            result = self.job(self.is_cancelled)
+        except RenderCancelled:
+            result = None
+        except Exception as err:
+            result, error = None, err
+        # Signal emitted from the worker is queued onto the UI thread
+        self.scheduler.task_done.emit(self.generation, result, error)
+
+
+class RenderScheduler(QObject):
+    # Emitted on the UI thread with the result of the most recent request
+    finished = pyqtSignal(object)
+    # ... or with the exception the most recent request raised
+    failed = pyqtSignal(object)
+    task_done = pyqtSignal(int, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.generation = 0
+        self.running = False
+        self.pending = None
+        self.task_done.connect(self.on_task_done)
+
+    def request(self, job):
+        # job(is_cancelled) runs on the worker thread. A newer request makes
+        # the running job stale and replaces any job still waiting to start,
+        # so only the latest one ever delivers a result.
+        self.generation += 1
+        self.pending = job
+        if not self.running:
+            self.start_pending()
+
+    def cancel(self):
+        self.generation += 1
+        self.pending = None
+
+    def wait(self):
+        self.pool.waitForDone()
+
+    def start_pending(self):
+        job, self.pending = self.pending, None
+        self.running = True
+        self.pool.start(RenderTask(job, self.generation, self))
+
+    def on_task_done(self, generation, result, error):
+        self.running = False
+        if self.pending is not None:
+            self.start_pending()
+        elif generation != self.generation:
+            return
+        elif error is not None:
+            self.failed.emit(error)
+        elif result is not None:
+            self.finished.emit(result)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+
+import tracing
+
+
+def write_image(image, path):
+    # Encode next to the target and rename over it, so a crash mid-write
+    # never leaves a truncated file behind. Pillow is imported here, not at
+    # module level: main.py creates its queue before the window is shown.
+    from PIL import Image
+    directory = os.path.dirname(path) or "."
+    image_format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file, tracing.span("encode"):
+            image.save(tmp_file, format=image_format)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SaveQueue:
+    # Writes images to disk on a background thread. Each path holds at most
+    # one pending image: a newer submit for the same path replaces the one
+    # still waiting, so a burst of edits is encoded once, in its final state.
+    # Images must not be modified after they are submitted.
+    def __init__(self):
+        self.pending = {}
+        self.writing = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="image-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, path, image):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Save queue is closed")
+            self.pending[path] = image
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                path = next(iter(self.pending))
+                image = self.pending.pop(path)
+                self.writing = path
+            try:
+                write_image(image, path)
+            except Exception as err:
+                print(f"Could not save {path}: {err}")
+            finally:
+                with self.condition:
+                    self.writing = None
+                    self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        # Block until everything submitted so far is on disk
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and self.writing is None, timeout)
+
+    def close(self):
+        # Pending writes are finished before the thread exits
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
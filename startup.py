@@ -0,0 +1,54 @@
+import importlib
+import threading
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# Both apps paint their window before doing anything slow. Connecting to
+# the database, checking the schema and importing the modules that are only
+# needed once there is data to show (the MySQL driver, asyncio, Pillow) run
+# on a worker thread started right after the first paint. Code that uses
+# those modules imports them where it needs them; if that happens before
+# the worker got to them, the import waits for it to finish.
+
+# Imported ahead of use by the startup thread
+HEAVY_MODULES = ["asyncio", "mysql.connector", "PIL.Image"]
+
+
+def preload(modules=HEAVY_MODULES):
+    for name in modules:
+        importlib.import_module(name)
+
+
+def after_first_paint(func):
+    # Zero-timeout timers run once the events queued by show() are handled
+    QTimer.singleShot(0, func)
+
+
+class StartupTask(QObject):
+    # Runs work() on a background thread and calls on_done(result) or
+    # on_error(error) on the UI thread
+    finished = pyqtSignal(object, object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.running = False
+        self.finished.connect(self.deliver)
+
+    def start(self, work, on_done, on_error):
+        self.running = True
+        thread = threading.Thread(target=self.run, args=(work, on_done, on_error), name="startup", daemon=True)
+        thread.start()
+
+    def run(self, work, on_done, on_error):
+        try:
+            result, error = work(), None
+        except Exception as err:
+            result, error = None, err
+        self.finished.emit(result, error, on_done, on_error)
+
+    def deliver(self, result, error, on_done, on_error):
+        self.running = False
+        if error is not None:
+            on_error(error)
+        else:
+            on_done(result)
@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
+
+# Tiled execution for very large images. Above TILE_THRESHOLD_PIXELS an
+# operation runs on full-width strips of about STRIP_PIXELS and the results
+# are pasted into one output image, so the temporaries Pillow makes along the
+# way (ImageEnhance's degenerate image, mode conversions) are strip-sized
+# instead of full-sized. Neighbourhood filters read `halo` extra rows above
+# and below each strip and crop them off again; Pillow leaves border rows
+# unfiltered, so with a halo of at least the kernel radius every kept row
+# sees exactly the neighbours it would in the whole image and the output is
+# identical to the untiled result.
+TILE_THRESHOLD_PIXELS = 50_000_000
+STRIP_PIXELS = 2_000_000
+
+# The same strips can also be processed on a thread pool: Pillow's filter,
+# blend, point and convert kernels release the GIL, so strips run on
+# separate cores. Every function below takes parallel=None (on above
+# PARALLEL_THRESHOLD_PIXELS), True or False. batch.py sets PARALLEL_WORKERS
+# to 1 in its worker processes, which already use every core.
+PARALLEL_THRESHOLD_PIXELS = 4_000_000
+PARALLEL_WORKERS = os.cpu_count() or 1
+
+executor = None
+executor_workers = 0
+executor_lock = threading.Lock()
+
+
+def should_tile(image):
+    width, height = image.size
+    return width * height > TILE_THRESHOLD_PIXELS
+
+
+def worker_count(image, parallel=None):
+    # Threads to use for image; 1 means run in the calling thread
+    if parallel is None:
+        width, height = image.size
+        parallel = width * height > PARALLEL_THRESHOLD_PIXELS
+    return PARALLEL_WORKERS if parallel else 1
+
+
+def get_executor(workers):
+    global executor, executor_workers
+    with executor_lock:
+        if executor_workers != workers:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="strip")
+            executor_workers = workers
+        return executor
+
+
+def strips(image, halo=0, count=1):
+    # Yields (top, bottom, source_top, source_bottom) for each strip; at
+    # least count strips so that many threads all have work
+    width, height = image.size
+    strip_height = max(1, min(STRIP_PIXELS // max(1, width), -(-height // count)))
+    for top in range(0, height, strip_height):
+        bottom = min(top + strip_height, height)
+        yield top, bottom, max(0, top - halo), min(height, bottom + halo)
+
+
+def run_strip(image, func, bounds):
+    top, bottom, source_top, source_bottom = bounds
+    width = image.size[0]
+    result = func(image.crop((0, source_top, width, source_bottom)))
+    if source_top != top or source_bottom != bottom:
+        result = result.crop((0, top - source_top, width, bottom - source_top))
+    return result
+
+
+def run_strips(image, func, halo=0, workers=1):
+    # Yields (top, func(strip)) in order. With several workers at most two
+    # strips per thread are in flight, keeping memory strip-sized.
+    if workers <= 1:
+        for bounds in strips(image, halo):
+            yield bounds[0], run_strip(image, func, bounds)
+        return
+    # Decode once up front; lazy loading is not safe to trigger from threads
+    image.load()
+    pool = get_executor(workers)
+    pending = deque()
+    for bounds in strips(image, halo, workers):
+        pending.append((bounds[0], pool.submit(run_strip, image, func, bounds)))
+        if len(pending) >= 2 * workers:
+            top, future = pending.popleft()
+            yield top, future.result()
+    while pending:
+        top, future = pending.popleft()
+        yield top, future.result()
+
+
+def map_strips(image, func, halo=0, workers=1):
+    # func must map an image to one of the same size
+    output = None
+    for top, result in run_strips(image, func, halo, workers):
+        if output is None:
+            output = Image.new(result.mode, image.size)
+            if result.mode == "P":
+                output.putpalette(result.getpalette())
+        output.paste(result, (0, top))
+    return output
+
+
+def map_image(image, func, halo=0, parallel=None):
+    workers = worker_count(image, parallel)
+    if workers <= 1 and not should_tile(image):
+        return func(image)
+    return map_strips(image, func, halo, workers)
+
+
+def filter_halo(kernel):
+    # Radius of a convolution kernel (BLUR is 5x5, SHARPEN and SMOOTH 3x3)
+    size = kernel.filterargs[0]
+    return max(size) // 2
+
+
+def gaussian_halo(radius):
+    # GaussianBlur runs three box blurs per axis, each reaching at most
+    # int(radius) + 1 pixels
+    return 3 * (int(radius) + 1)
+
+
+def filter_image(image, kernel, parallel=None):
+    return map_image(image, lambda strip: strip.filter(kernel), filter_halo(kernel), parallel)
+
+
+def enhance(image, enhancer_class, factor, parallel=None):
+    # ImageEnhance.<enhancer_class>(image).enhance(factor), strip by strip
+    workers = worker_count(image, parallel)
+    if workers <= 1 and not should_tile(image):
+        return enhancer_class(image).enhance(factor)
+    if enhancer_class is ImageEnhance.Contrast:
+        return contrast(image, factor, workers)
+    halo = filter_halo(ImageFilter.SMOOTH) if enhancer_class is ImageEnhance.Sharpness else 0
+    return map_strips(image, lambda strip: enhancer_class(strip).enhance(factor), halo, workers)
+
+
+def luminance_histogram(strip):
+    if strip.mode != "L":
+        strip = strip.convert("L")
+    return strip.histogram()
+
+
+def contrast(image, factor, workers=1):
+    # Contrast pulls towards the mean luminance of the whole image, so that
+    # is gathered first from per-strip histograms
+    histogram = [0] * 256
+    for _, strip_histogram in run_strips(image, luminance_histogram, 0, workers):
+        histogram = [a + b for a, b in zip(histogram, strip_histogram)]
+    mean = int(ImageStat.Stat(histogram).mean[0] + 0.5)
+
+    def contrast_strip(strip):
+        # Same degenerate image ImageEnhance.Contrast builds
+        degenerate = Image.new("L", strip.size, mean)
+        if degenerate.mode != strip.mode:
+            degenerate = degenerate.convert(strip.mode)
+        if "A" in strip.getbands():
+            degenerate.putalpha(strip.getchannel("A"))
+        return Image.blend(degenerate, strip, factor)
+
+    return map_strips(image, contrast_strip, 0, workers)
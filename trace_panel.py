@@ -0,0 +1,39 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QFileDialog, QHBoxLayout, QLabel, QMessageBox, QPushButton, QWidget
+
+import tracing
+
+# Stages in the order they happen when an image is opened and edited
+STAGES = ["db.query", "db.commit", "decode", "transform", "encode", "pixmap.scale"]
+
+REFRESH_MS = 1000
+
+
+class TraceStatus(QWidget):
+    # Rolling p50/p95 per stage, refreshed once a second, and a button to
+    # save the spans recorded so far as a Chrome trace. Only created when
+    # tracing is on.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.label = QLabel("Tracing: no spans yet")
+        self.export_btn = QPushButton("Export Trace")
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label, 1)
+        layout.addWidget(self.export_btn)
+        self.export_btn.clicked.connect(self.export)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+
+    def refresh(self):
+        text = tracing.format_summary(STAGES + sorted(set(tracing.summary()) - set(STAGES)))
+        if text:
+            self.label.setText(f"p50/p95: {text}")
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Trace files (*.json)")
+        if path:
+            count = tracing.export_chrome_trace(path)
+            QMessageBox.information(self, "Trace Exported", f"Wrote {count} spans to {path}")
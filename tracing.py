@@ -0,0 +1,156 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+# Lightweight timing spans for the hot paths of both apps:
+#
+#   with tracing.span("decode"):
+#       image.load()
+#
+# Tracing is off unless PHOTO_TRACE is set in the environment (or enable()
+# is called). Off, span() returns one shared no-op object, so an
+# instrumented call costs a global lookup and a function call. On, every
+# span keeps its duration in a rolling window per stage, for percentiles in
+# the UI, and as an event for export in Chrome's trace-event format (open it
+# in chrome://tracing or ui.perfetto.dev). If PHOTO_TRACE names a .json file
+# the trace is written there when the process exits.
+#
+# Stage names used across the code: decode, transform, encode, db.query,
+# db.commit, pixmap.scale.
+
+# Durations kept per stage for the rolling percentiles
+WINDOW = 500
+
+# Events kept for export; the oldest are dropped beyond this
+MAX_EVENTS = 200_000
+
+enabled = False
+lock = threading.Lock()
+durations = defaultdict(lambda: deque(maxlen=WINDOW))
+events = deque(maxlen=MAX_EVENTS)
+thread_names = {}
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        record(self.name, self.start, end, self.args)
+        return False
+
+
+def span(name, **args):
+    # args end up in the exported event, e.g. span("transform", op="Blur")
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def record(name, start, end, args=None):
+    thread = threading.current_thread()
+    with lock:
+        durations[name].append(end - start)
+        events.append((name, start, end, thread.ident, args))
+        thread_names.setdefault(thread.ident, thread.name)
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with lock:
+        durations.clear()
+        events.clear()
+        thread_names.clear()
+
+
+def percentile(values, fraction):
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+def summary():
+    # {stage: (count, p50, p95, p99)} over the rolling window, in seconds
+    with lock:
+        windows = {name: sorted(values) for name, values in durations.items() if values}
+    return {
+        name: (
+            len(values),
+            percentile(values, 0.50) / 1e9,
+            percentile(values, 0.95) / 1e9,
+            percentile(values, 0.99) / 1e9,
+        )
+        for name, values in windows.items()
+    }
+
+
+def format_summary(stages=None):
+    # One line for a status bar, e.g. "decode 12/30 ms | transform 80/95 ms"
+    # (p50/p95)
+    stats = summary()
+    names = [name for name in (stages or sorted(stats)) if name in stats]
+    return " | ".join(
+        f"{name} {milliseconds(stats[name][1])}/{milliseconds(stats[name][2])} ms" for name in names
+    )
+
+
+def milliseconds(seconds):
+    value = seconds * 1000
+    return f"{value:.1f}" if value < 10 else f"{value:.0f}"
+
+
+def export_chrome_trace(path):
+    with lock:
+        recorded = list(events)
+        names = dict(thread_names)
+    pid = os.getpid()
+    trace = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in names.items()
+    ]
+    for name, start, end, tid, args in recorded:
+        event = {
+            "name": name,
+            "cat": name.split(".")[0],
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        trace.append(event)
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, trace_file)
+    return len(recorded)
+
+
+TRACE_SETTING = os.environ.get("PHOTO_TRACE", "")
+if TRACE_SETTING:
+    enable()
+    if TRACE_SETTING.endswith(".json"):
+        atexit.register(export_chrome_trace, TRACE_SETTING)
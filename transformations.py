@@ -0,0 +1,25 @@
+from PIL import Image, ImageEnhance, ImageFilter
+
+import tiled
+import tracing
+
+# The main.py filter buttons, by name. Shared with batch.py so the GUI and
+# the command line produce the same files. Large images are processed in
+# strips (see tiled.py).
+TRANSFORMATIONS = {
+    "Left": lambda img: img.rotate(270),
+    "Right": lambda img: img.rotate(90),
+    "Mirror": lambda img: img.transpose(Image.FLIP_LEFT_RIGHT),
+    "Sharpness": lambda img: tiled.enhance(img, ImageEnhance.Sharpness, 2.0),
+    "B/W": lambda img: img.convert("L"),
+    "Saturation": lambda img: tiled.enhance(img, ImageEnhance.Color, 2.0),
+    "Contrast": lambda img: tiled.enhance(img, ImageEnhance.Contrast, 2.0),
+    "Blur": lambda img: tiled.filter_image(img, ImageFilter.BLUR),
+}
+
+
+def apply_chain(image, names):
+    for name in names:
+        with tracing.span("transform", op=name):
+            image = TRANSFORMATIONS[name](image)
+    return image